@@ -0,0 +1,108 @@
+"""Deferred imports, so the strategy scripts can be imported quickly.
+
+Nothing is imported until it is first used, e.g.:
+
+bf = lazy_module("rubin_scheduler.scheduler.basis_functions")
+CoreScheduler, sim_runner = lazy_from("rubin_scheduler.scheduler", "CoreScheduler", "sim_runner")
+"""
+
+__all__ = ("lazy_module", "lazy_from")
+
+import importlib
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in for a module, imported on first attribute access
+
+    After the import the module's namespace is copied in, so later
+    lookups cost the same as on the real module.
+    """
+
+    def __init__(self, name, on_import=None):
+        super().__init__(name)
+        self.__dict__["_lazy_on_import"] = on_import
+
+    def __getattr__(self, attr):
+        # Only called for attributes not already in __dict__
+        on_import = self.__dict__.pop("_lazy_on_import", None)
+        if on_import is not None:
+            on_import()
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return "<lazy module %s>" % self.__name__
+
+
+class _LazyAttribute:
+    """Stand-in for a function or class from a module, imported when
+    it is first called
+
+    A stand-in for a class also works with isinstance, issubclass, and
+    as a base class. Anything that needs the real type object, such as
+    ndarray.view, has to be given `resolve()`.
+    """
+
+    def __init__(self, module, name):
+        self._module = module
+        self._name = name
+
+    def resolve(self):
+        """The real object"""
+        return getattr(self._module, self._name)
+
+    def __call__(self, *args, **kwargs):
+        return getattr(self._module, self._name)(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __instancecheck__(self, instance):
+        return isinstance(instance, self.resolve())
+
+    def __subclasscheck__(self, subclass):
+        return issubclass(subclass, self.resolve())
+
+    def __mro_entries__(self, bases):
+        # So "class MySurvey(BlobSurvey)" subclasses the real class
+        return (self.resolve(),)
+
+    def __repr__(self):
+        return "<lazy %s.%s>" % (self._module.__name__, self._name)
+
+
+def lazy_module(name, on_import=None):
+    """Module that is imported the first time it is used
+
+    Parameters
+    ----------
+    name : `str`
+        Full name of the module, e.g. "healpy" or "astropy.units".
+    on_import : callable
+        Called with no arguments just before the module is imported.
+        Default None.
+    """
+    return _LazyModule(name, on_import=on_import)
+
+
+def lazy_from(module_name, *names, on_import=None):
+    """Like ``from module_name import names``, but only imported when
+    one of the names is first called
+
+    Returns
+    -------
+    attributes : stand-in, or `tuple` of stand-ins if more than one name
+        Call them like the real thing. Classes also work with
+        isinstance and issubclass, and can be subclassed. Use
+        `resolve()` where the real object is needed, e.g. for
+        ndarray.view.
+    """
+    module = _LazyModule(module_name, on_import=on_import)
+    attributes = tuple(_LazyAttribute(module, name) for name in names)
+    if len(attributes) == 1:
+        return attributes[0]
+    return attributes
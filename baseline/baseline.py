@@ -1,5 +1,13 @@
 __all__ = (
     "example_scheduler",
+    "cached_setup_arrays",
+    "load_variant_specs",
+    "run_variants",
+    "run_fanout",
+    "gen_setup_arrays",
+    "strategy_config",
+    "STRATEGY_DEFAULTS",
+    "VARIANTS",
     "sched_argparser",
     "set_run_info",
     "run_sched",
@@ -12,23 +20,68 @@ __all__ = (
 )
 
 import argparse
+import ast
+import copy
+import glob
+import hashlib
+import importlib
+import multiprocessing
 import os
+import pickle
+import random
+import resource
 import subprocess
 import sys
+import time
+import tomllib
+import warnings
+from functools import partial, wraps
 
-import healpy as hp
 import numpy as np
-from astropy import units as u
-from astropy.coordinates import SkyCoord
-from astropy.utils import iers
 
 import rubin_scheduler
-import rubin_scheduler.scheduler.basis_functions as bf
-import rubin_scheduler.scheduler.detailers as detailers
-from rubin_scheduler.scheduler import sim_runner
-from rubin_scheduler.scheduler.model_observatory import ModelObservatory
-from rubin_scheduler.scheduler.schedulers import CoreScheduler, SimpleBandSched
-from rubin_scheduler.scheduler.surveys import (
+
+# The helper modules sit next to this file, which isn't on sys.path
+# when baseline.py is imported from another directory
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from _sched_lazy import lazy_from, lazy_module
+from sched_profile import SchedulerProfiler
+
+
+def _configure_iers():
+    from astropy.utils import iers
+
+    # So things don't fail on hyak
+    iers.conf.auto_download = False
+    # XXX--note this line probably shouldn't be in production
+    iers.conf.auto_max_age = None
+
+
+# The scheduler, astropy, healpy and pandas are only imported once they
+# are used, so importing this module (e.g., for the survey building
+# functions) is fast. That includes rubin_scheduler.utils, which imports
+# healpy, astropy and scipy, so its DEFAULT_NSIDE and SURVEY_START_MJD
+# are looked up when a function needs them rather than used as default
+# argument values. See benchmarks/run_benchmarks.py for import time.
+hp = lazy_module("healpy")
+rs_utils = lazy_module("rubin_scheduler.utils")
+_hpid2_ra_dec = lazy_from("rubin_scheduler.utils", "_hpid2_ra_dec")
+pd = lazy_module("pandas")
+u = lazy_module("astropy.units", on_import=_configure_iers)
+SkyCoord = lazy_from("astropy.coordinates", "SkyCoord", on_import=_configure_iers)
+bf = lazy_module("rubin_scheduler.scheduler.basis_functions", on_import=_configure_iers)
+detailers = lazy_module("rubin_scheduler.scheduler.detailers", on_import=_configure_iers)
+get_data_dir = lazy_from("rubin_scheduler.data", "get_data_dir")
+sim_runner = lazy_from("rubin_scheduler.scheduler", "sim_runner", on_import=_configure_iers)
+ModelObservatory = lazy_from(
+    "rubin_scheduler.scheduler.model_observatory", "ModelObservatory", on_import=_configure_iers
+)
+CoreScheduler, SimpleBandSched = lazy_from(
+    "rubin_scheduler.scheduler.schedulers", "CoreScheduler", "SimpleBandSched", on_import=_configure_iers
+)
+(
     BlobSurvey,
     GreedySurvey,
     LongGapSurvey,
@@ -37,25 +90,49 @@ from rubin_scheduler.scheduler.surveys import (
     gen_roman_on_season,
     gen_too_surveys,
     generate_ddf_scheduled_obs,
+) = lazy_from(
+    "rubin_scheduler.scheduler.surveys",
+    "BlobSurvey",
+    "GreedySurvey",
+    "LongGapSurvey",
+    "ScriptedSurvey",
+    "gen_roman_off_season",
+    "gen_roman_on_season",
+    "gen_too_surveys",
+    "generate_ddf_scheduled_obs",
+    on_import=_configure_iers,
 )
-from rubin_scheduler.scheduler.targetofo import gen_all_events
-from rubin_scheduler.scheduler.utils import (
+gen_all_events = lazy_from("rubin_scheduler.scheduler.targetofo", "gen_all_events", on_import=_configure_iers)
+(
     ConstantFootprint,
     CurrentAreaMap,
+    ScheduledObservationArray,
+    SchemaConverter,
     make_rolling_footprints,
+) = lazy_from(
+    "rubin_scheduler.scheduler.utils",
+    "ConstantFootprint",
+    "CurrentAreaMap",
+    "ScheduledObservationArray",
+    "SchemaConverter",
+    "make_rolling_footprints",
+    on_import=_configure_iers,
 )
-from rubin_scheduler.site_models import Almanac
-from rubin_scheduler.utils import DEFAULT_NSIDE, SURVEY_START_MJD, _hpid2_ra_dec
+Almanac = lazy_from("rubin_scheduler.site_models", "Almanac", on_import=_configure_iers)
+write_report = lazy_from("preview_report", "write_report")
+NightTelemetry = lazy_from("sched_telemetry", "NightTelemetry")
+
+# Bump if the contents of the setup cache files change
+SETUP_CACHE_VERSION = 1
 
-# So things don't fail on hyak
-iers.conf.auto_download = False
-# XXX--note this line probably shouldn't be in production
-iers.conf.auto_max_age = None
+# Resolutions supported by --preview. Only the scheduler nside changes,
+# the sky brightness is still interpolated at nside 32 and downgraded
+PREVIEW_NSIDES = (8, 16)
 
 
 def example_scheduler(
-    nside: int = DEFAULT_NSIDE,
-    mjd_start: float = SURVEY_START_MJD,
+    nside: int | None = None,
+    mjd_start: float | None = None,
     no_too: bool = False,
 ) -> CoreScheduler:
     """Provide an example baseline survey-strategy scheduler.
@@ -64,8 +141,10 @@ def example_scheduler(
     ----------
     nside : `int`
         Nside for the scheduler maps and basis functions.
+        Default None uses DEFAULT_NSIDE.
     mjd_start : `float`
-        Start date for the survey (MJD).
+        Start date for the survey (MJD). Default None uses
+        SURVEY_START_MJD.
     no_too : `bool`
         Turn off ToO simulation. Default False.
 
@@ -81,7 +160,8 @@ def example_scheduler(
     args.dbroot = "example_"
     args.outDir = "."
     args.nside = nside
-    args.mjd_start = mjd_start
+    args.mjd_start = rs_utils.SURVEY_START_MJD if mjd_start is None else mjd_start
+    args.no_setup_cache = True
     scheduler = gen_scheduler(args)
     return scheduler
 
@@ -512,7 +592,7 @@ def blob_for_long(
 
 def gen_long_gaps_survey(
     footprints,
-    nside=DEFAULT_NSIDE,
+    nside=None,
     night_pattern=[True, True],
     gap_range=[2, 7],
     HA_min=12,
@@ -559,6 +639,8 @@ def gen_long_gaps_survey(
     nexp : `int`
         Number of exposures per visit. Default 2.
     """
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
 
     surveys = []
     f1 = ["g", "r", "i"]
@@ -595,7 +677,7 @@ def gen_long_gaps_survey(
 
 
 def gen_greedy_surveys(
-    nside=DEFAULT_NSIDE,
+    nside=None,
     nexp=2,
     exptime=29.2,
     bands=["r", "i", "z", "y"],
@@ -624,7 +706,7 @@ def gen_greedy_surveys(
     Parameters
     ----------
     nside : `int`
-        The HEALpix nside to use
+        The HEALpix nside to use. Default None uses DEFAULT_NSIDE.
     nexp : `int`
         The number of exposures to use in a visit. Default 1.
     exptime : `float`
@@ -661,6 +743,8 @@ def gen_greedy_surveys(
         The weight on basis function that tries to stay avoid band changes.
         Default 3.0 (uniteless).
     """
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
     # Define the extra parameters that are used in the greedy survey. I
     # think these are fairly set, so no need to promote to utility func kwargs
     greed_survey_params = {
@@ -1224,6 +1308,7 @@ def ddf_surveys(
     nside=None,
     expt=29.2,
     nexp=2,
+    obs_array=None,
 ):
     """Generate surveys for DDF observations
 
@@ -1239,11 +1324,14 @@ def ddf_surveys(
         Default None.
     expt : `float`
         Exposure time for DDF visits. Default 29.2.
+    obs_array : `ScheduledObservationArray`
+        Pre-generated DDF observations. Default None generates them.
     """
     nsnaps = [1, 2, 2, 2, 2, 2]
     if nexp == 1:
         nsnaps = [1, 1, 1, 1, 1, 1]
-    obs_array = generate_ddf_scheduled_obs(offseason_length=offseason_length, expt=expt, nsnaps=nsnaps)
+    if obs_array is None:
+        obs_array = generate_ddf_scheduled_obs(offseason_length=offseason_length, expt=expt, nsnaps=nsnaps)
     euclid_obs = np.where(
         (obs_array["scheduler_note"] == "DD:EDFS_b") | (obs_array["scheduler_note"] == "DD:EDFS_a")
     )[0]
@@ -1260,7 +1348,26 @@ def ddf_surveys(
     return [survey1, survey2]
 
 
-def ecliptic_target(nside=DEFAULT_NSIDE, dist_to_eclip=40.0, dec_max=30.0, mask=None):
+# Ecliptic latitude of each HEALpix, keyed by nside
+_ECLIPTIC_LAT = {}
+
+
+def ecliptic_latitude(nside=None):
+    """Ecliptic latitude of each HEALpix center (radians)
+
+    The coordinate transform is slow, so the result is kept for
+    each nside. Default None uses DEFAULT_NSIDE.
+    """
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
+    if nside not in _ECLIPTIC_LAT:
+        ra, dec = _hpid2_ra_dec(nside, np.arange(hp.nside2npix(nside)))
+        coord = SkyCoord(ra=ra * u.rad, dec=dec * u.rad)
+        _ECLIPTIC_LAT[nside] = coord.barycentrictrueecliptic.lat.radian
+    return _ECLIPTIC_LAT[nside]
+
+
+def ecliptic_target(nside=None, dist_to_eclip=40.0, dec_max=30.0, mask=None):
     """Generate a target_map for the area around the ecliptic
 
     Parameters
@@ -1277,11 +1384,12 @@ def ecliptic_target(nside=DEFAULT_NSIDE, dist_to_eclip=40.0, dec_max=30.0, mask=
         Any additional mask to apply, should be a
         HEALpix mask with matching nside. Default None.
     """
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
 
     ra, dec = _hpid2_ra_dec(nside, np.arange(hp.nside2npix(nside)))
     result = np.zeros(ra.size)
-    coord = SkyCoord(ra=ra * u.rad, dec=dec * u.rad)
-    eclip_lat = coord.barycentrictrueecliptic.lat.radian
+    eclip_lat = ecliptic_latitude(nside)
     good = np.where((np.abs(eclip_lat) < np.radians(dist_to_eclip)) & (dec < np.radians(dec_max)))
     result[good] += 1
 
@@ -1479,6 +1587,446 @@ def generate_twilight_near_sun(
     return surveys
 
 
+# Knobs that differ between survey strategy variants, and their
+# baseline values. Anything here can be overridden with a variant
+# name, a TOML file, a dict, or --set on the command line.
+STRATEGY_DEFAULTS = {
+    # Tag added to the output database name. {mjd_plus} and
+    # {cloud_offset_year} are filled in.
+    "file_end": "v4.3.5_",
+    # Number of exposures per visit. None uses --nexp.
+    "nexp": None,
+    "max_dither": 0.2,  # Degrees. For DDFs
+    "ddf_offseason_length": 365.25 * 0.2,  # Amount of season not to use for DDFs
+    "illum_limit": 40.0,  # Percent. Lunar illumination used for band loading
+    "u_exptime": 38.0,  # Seconds
+    "nslice": 2,  # N slices for rolling
+    "rolling_scale": 0.9,  # Strength of rolling
+    "rolling_uniform": True,  # Should we use the uniform rolling flag
+    "n_cycles": 3,  # Number of rolling cycles
+    "n_constant_start": None,  # Seasons before rolling starts. None uses the default
+    "nights_off": 3,  # For long gaps
+    "ei_night_pattern": 4,  # select doing earth interior observation every 4 nights
+    "ei_bands": "riz",  # Bands to use for earth interior observations.
+    "ei_repeat": 4,  # Number of times to repeat earth interior observations
+    "ei_am": 2.5,  # Earth interior airmass limit
+    "ei_elong_req": 45.0,  # Solar elongation required for inner solar system
+    "ei_area_req": 0.0,  # Sky area required before attempting inner solar system
+    "per_night": True,  # Dither DDF per night
+    "camera_ddf_rot_limit": 75.0,  # degrees
+    "too_scale": 1.0,  # Scale for the number of simulated ToO events
+    # Which year of cloud data to start with. None uses the default.
+    "cloud_offset_year": None,
+    # "module:function" to generate the DDF scheduled observations,
+    # called with ddf_generator_kwargs. None uses the rubin_scheduler
+    # generate_ddf_scheduled_obs.
+    "ddf_generator": None,
+    "ddf_generator_kwargs": {},
+    # "module:function" specs for any additional surveys, each called
+    # as func(nside, nexp=nexp, footprints=footprints) and put in the
+    # survey list ahead of the blob surveys.
+    "extra_surveys": [],
+}
+
+# Named sets of overrides for the strategy variants that used to be
+# separate copies of this script.
+VARIANTS = {
+    "baseline": {},
+    "one_snap": {"nexp": 1},
+    "start_date": {"file_end": "mjdp{mjd_plus}_v4.3.5_"},
+    "four_roll": {"n_cycles": 4, "rolling_uniform": False, "n_constant_start": 3},
+    "weather": {"cloud_offset_year": 0, "file_end": "cloudso{cloud_offset_year}v4.3.5_"},
+}
+
+# Things that are slow to make and can be shared by every variant built
+# in the same process.
+_SETUP_ARRAYS = {}
+_TOO_EVENTS = {}
+_DDF_OBS = {}
+
+
+def import_from_spec(spec):
+    """Return the object named by a "module:attribute" string"""
+    module_name, attr = spec.split(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def parse_overrides(settings):
+    """Turn a list of "key=value" strings into a dict
+
+    Values are read as python literals where possible, and kept as
+    strings otherwise.
+    """
+    overrides = {}
+    for setting in settings:
+        key, value = setting.split("=", 1)
+        try:
+            overrides[key.strip()] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[key.strip()] = value
+    return overrides
+
+
+def strategy_config(variant=None, config_file=None, overrides=None):
+    """Build the full set of strategy knobs for a run
+
+    Parameters
+    ----------
+    variant : `str`
+        Name of an entry in `VARIANTS` to start from. Default None
+        uses the baseline.
+    config_file : `str`
+        TOML file of knobs to apply after the variant. Default None.
+    overrides : `dict`
+        Knobs to apply last. Default None.
+
+    Returns
+    -------
+    config : `dict`
+        `STRATEGY_DEFAULTS` with all of the overrides applied.
+    """
+    config = copy.deepcopy(STRATEGY_DEFAULTS)
+    layers = []
+    if variant is not None:
+        if variant not in VARIANTS:
+            raise ValueError("Unknown variant %s, options are %s" % (variant, ", ".join(VARIANTS)))
+        layers.append(VARIANTS[variant])
+    if config_file is not None:
+        with open(config_file, "rb") as f:
+            layers.append(tomllib.load(f))
+    if overrides is not None:
+        layers.append(overrides)
+
+    for layer in layers:
+        unknown = set(layer) - set(STRATEGY_DEFAULTS)
+        if len(unknown) > 0:
+            raise ValueError("Unknown strategy knobs: %s" % ", ".join(sorted(unknown)))
+        config.update(copy.deepcopy(layer))
+    return config
+
+
+def setup_cache_file(cache_dir, **kwargs):
+    """Name of the setup cache file for a set of parameters
+
+    The name is a hash of the parameters, the rubin_scheduler version,
+    and the contents of the DDF grid file (like ddf_ocean's
+    `ddf_schedule_hash`), so a change in any of them makes a new file.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(repr((SETUP_CACHE_VERSION, rubin_scheduler.__version__)).encode())
+    hasher.update(repr(sorted(kwargs.items())).encode())
+    ddf_grid_file = os.path.join(get_data_dir(), "scheduler", "ddf_grid.npz")
+    if os.path.isfile(ddf_grid_file):
+        with open(ddf_grid_file, "rb") as infile:
+            for chunk in iter(lambda: infile.read(2**20), b""):
+                hasher.update(chunk)
+    return os.path.join(cache_dir, "setup_%s.npz" % hasher.hexdigest()[:16])
+
+
+def gen_setup_arrays(nside=None, nexp=2, ddf_offseason_length=73.05):
+    """Compute the slow-to-generate inputs of `gen_scheduler`
+
+    Parameters
+    ----------
+    nside : `int`
+        The HEALpix nside to use.
+    nexp : `int`
+        Number of exposures per visit.
+    ddf_offseason_length : `float`
+        Amount of season not to use for DDFs (days).
+
+    Returns
+    -------
+    arrays : `dict` of `np.array`
+        The footprint maps ("footprints_hp") and region labels
+        ("labels") from CurrentAreaMap, the ecliptic latitude of each
+        HEALpix ("eclip_lat"), and the DDF scheduled observations
+        ("ddf_obs").
+    """
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
+    sky = CurrentAreaMap(nside=nside)
+    footprints_hp_array, labels = sky.return_maps()
+
+    nsnaps = [1, 2, 2, 2, 2, 2]
+    if nexp == 1:
+        nsnaps = [1, 1, 1, 1, 1, 1]
+    ddf_obs = generate_ddf_scheduled_obs(
+        offseason_length=ddf_offseason_length, expt=29.2, nsnaps=nsnaps
+    )
+
+    arrays = {
+        "footprints_hp": footprints_hp_array,
+        "labels": np.asarray(labels).astype(str),
+        "eclip_lat": ecliptic_latitude(nside),
+        "ddf_obs": np.asarray(ddf_obs),
+    }
+    return arrays
+
+
+def cached_setup_arrays(cache_dir=None, refresh=False, **kwargs):
+    """Load the `gen_setup_arrays` output from disk, generating it
+    if needed
+
+    Everything is saved as plain arrays in an npz file, so no pickles
+    are involved. Runs that share a configuration, e.g., a --setup_only
+    run followed by the real run, or the runs in weather.sh, only pay
+    for the setup once. The arrays are also kept in memory, so
+    variants built in the same process share them.
+
+    Parameters
+    ----------
+    cache_dir : `str`
+        Directory for cache files. Default None does not cache.
+    refresh : `bool`
+        Regenerate the arrays even if a cache file exists.
+        Default False.
+    **kwargs
+        Passed to `gen_setup_arrays`.
+
+    Returns
+    -------
+    arrays : `dict` of `np.array`
+    """
+    if kwargs.get("nside") is None:
+        kwargs["nside"] = rs_utils.DEFAULT_NSIDE
+    memo_key = repr(sorted(kwargs.items()))
+    if memo_key in _SETUP_ARRAYS and not refresh:
+        return _SETUP_ARRAYS[memo_key]
+
+    if cache_dir is None:
+        _SETUP_ARRAYS[memo_key] = gen_setup_arrays(**kwargs)
+        return _SETUP_ARRAYS[memo_key]
+
+    filename = setup_cache_file(cache_dir, **kwargs)
+    if os.path.isfile(filename) and not refresh:
+        try:
+            with np.load(filename, allow_pickle=False) as data:
+                arrays = {key: data[key] for key in data.files}
+            arrays["ddf_obs"] = arrays["ddf_obs"].view(ScheduledObservationArray.resolve())
+            _ECLIPTIC_LAT[kwargs["nside"]] = arrays["eclip_lat"]
+            _SETUP_ARRAYS[memo_key] = arrays
+            return arrays
+        except (OSError, ValueError, KeyError):
+            warnings.warn("Could not read setup cache %s, regenerating" % filename)
+
+    arrays = gen_setup_arrays(**kwargs)
+    # Write to a temporary file first so runs starting at the same
+    # time never see a partial file.
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_file = "%s.%i.tmp.npz" % (filename[:-4], os.getpid())
+    np.savez(temp_file, **arrays)
+    os.replace(temp_file, filename)
+    _SETUP_ARRAYS[memo_key] = arrays
+    return arrays
+
+
+def too_events(scale=1.0, nside=None):
+    """Simulated ToO events, shared by variants built in one process
+
+    Returns a copy of the `gen_all_events` output, so a run can't
+    change the events another variant sees.
+    """
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
+    key = (scale, nside)
+    if key not in _TOO_EVENTS:
+        _TOO_EVENTS[key] = gen_all_events(scale=scale, nside=nside)
+    return copy.deepcopy(_TOO_EVENTS[key])
+
+
+def variant_ddf_obs(ddf_generator, ddf_generator_kwargs):
+    """DDF scheduled observations from a "module:function" generator,
+    shared by variants built in one process.
+    """
+    key = (ddf_generator, repr(sorted(ddf_generator_kwargs.items())))
+    if key not in _DDF_OBS:
+        _DDF_OBS[key] = import_from_spec(ddf_generator)(**ddf_generator_kwargs)
+    return _DDF_OBS[key]
+
+
+def load_variant_specs(filename):
+    """Read a list of variant specs from a TOML file
+
+    Each [[variant]] table needs a unique "name", and can have
+    "dbroot" (database root, defaults to the name), "variant" (a key of
+    `VARIANTS`), "config" (a TOML file of knobs), and a "set" table of
+    knobs, e.g.::
+
+        [[variant]]
+        name = "weather_cloudso2"
+        dbroot = "weather"
+        variant = "weather"
+        set = {cloud_offset_year = 2}
+    """
+    with open(filename, "rb") as f:
+        specs = tomllib.load(f)["variant"]
+    names = [spec["name"] for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Variant names in %s are not unique" % filename)
+    return specs
+
+
+def _variant_config(spec):
+    return strategy_config(
+        variant=spec.get("variant"), config_file=spec.get("config"), overrides=spec.get("set")
+    )
+
+
+def _run_variant(spec, args):
+    """Build and run one variant, returning timing and memory use"""
+    t0 = time.time()
+    run_args = copy.copy(args)
+    run_args.dbroot = spec.get("dbroot", spec["name"])
+    run_args.variant = spec.get("variant")
+    run_args.setup_only = False
+    result = {"name": spec["name"], "error": None}
+    try:
+        gen_scheduler(run_args, config=_variant_config(spec))
+    except Exception as error:
+        result["error"] = repr(error)
+    result["wall_time"] = time.time() - t0
+    # ru_maxrss is in kilobytes on linux
+    result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return result
+
+
+def run_variants(specs, args, n_workers=1):
+    """Run many strategy variants from one process
+
+    The footprints, DDF observations and ToO events every variant needs
+    are made once in this process. Each variant then runs in a forked
+    worker, so they share that state copy-on-write instead of every
+    run importing and rebuilding it.
+
+    Parameters
+    ----------
+    specs : `list` of `dict`
+        Variant specs, see `load_variant_specs`.
+    args : `argparse.Namespace`
+        Arguments from `sched_argparser` shared by all the runs.
+    n_workers : `int`
+        Number of variants to run at once. Default 1 runs them one
+        after another. Either way each variant runs in its own forked
+        process, so the peak memory reported is for that variant alone.
+
+    Returns
+    -------
+    results : `list` of `dict`
+        Name, wall time (seconds), peak memory (MB), and any error
+        for each variant.
+    """
+    # Warm the shared state
+    setup_cache_dir = args.setup_cache_dir
+    if args.no_setup_cache:
+        setup_cache_dir = None
+    nside = args.nside if args.preview is None else args.preview
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
+    for spec in specs:
+        config = _variant_config(spec)
+        nexp = args.nexp if config["nexp"] is None else config["nexp"]
+        cached_setup_arrays(
+            cache_dir=setup_cache_dir,
+            nside=nside,
+            nexp=nexp,
+            ddf_offseason_length=config["ddf_offseason_length"],
+        )
+        if config["ddf_generator"] is not None:
+            variant_ddf_obs(config["ddf_generator"], config["ddf_generator_kwargs"])
+        if not args.no_too:
+            too_events(scale=config["too_scale"], nside=nside)
+
+    run_func = partial(_run_variant, args=args)
+    # One fresh fork per variant, even when running one at a time, so
+    # nothing leaks between runs and each peak memory is its own.
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes=max(n_workers, 1), maxtasksperchild=1) as pool:
+        results = []
+        for result in pool.imap_unordered(run_func, specs):
+            print(
+                "%s done in %.1f min, %.0f MB"
+                % (result["name"], result["wall_time"] / 60, result["max_rss_mb"])
+            )
+            results.append(result)
+
+    print("%-30s %10s %10s" % ("variant", "minutes", "max MB"))
+    for result in results:
+        line = "%-30s %10.1f %10.0f" % (result["name"], result["wall_time"] / 60, result["max_rss_mb"])
+        if result["error"] is not None:
+            line += "  FAILED: %s" % result["error"]
+        print(line)
+
+    return results
+
+
+# Knobs that change the observatory, which a variant started from a
+# prefix checkpoint can't do
+_OBSERVATORY_KNOBS = ("cloud_offset_year", "too_scale")
+
+
+def run_fanout(specs, args, prefix_nights, n_workers=1):
+    """Run the nights variants have in common once, then fork each
+    variant from there
+
+    For variants that only differ after some night (e.g., a change that
+    starts in year 3), the shared prefix is simulated once with the
+    args variant and checkpointed. Each variant then builds its own
+    scheduler, has the prefix observations added to it, and simulates
+    the rest of the survey from the prefix's observatory. Results are
+    only meaningful if the variants would make the same choices over the
+    prefix. Since they all continue from the prefix's observatory,
+    variants that set cloud_offset_year or too_scale differently from
+    the prefix raise a ValueError before anything is run (mjd_plus and
+    nside come from args, so are shared anyway).
+
+    Parameters
+    ----------
+    specs : `list` of `dict`
+        Variant specs, see `load_variant_specs`.
+    args : `argparse.Namespace`
+        Arguments from `sched_argparser`. The prefix is run with
+        args.variant, args.config, and args.set.
+    prefix_nights : `float`
+        Number of nights in the shared prefix.
+    n_workers : `int`
+        Number of variants to run at once. Default 1.
+
+    Returns
+    -------
+    results : `list` of `dict`
+        See `run_variants`.
+    """
+    prefix_config = strategy_config(
+        variant=args.variant, config_file=args.config, overrides=parse_overrides(args.set)
+    )
+    for spec in specs:
+        config = _variant_config(spec)
+        changed = [key for key in _OBSERVATORY_KNOBS if config[key] != prefix_config[key]]
+        if changed:
+            raise ValueError(
+                "Variant %s sets %s differently from the prefix, run it without a prefix"
+                % (spec["name"], ", ".join(changed))
+            )
+
+    prefix_args = copy.copy(args)
+    prefix_args.setup_only = False
+    prefix_args.survey_length = prefix_nights
+    prefix_args.checkpoint_nights = prefix_nights
+    prefix_args.checkpoint_dir = os.path.join(args.checkpoint_dir, "prefix_%i" % os.getpid())
+    prefix_args.resume_from = None
+    prefix_args.prefix_from = None
+    prefix_args.dbroot = "prefix"
+    t0 = time.time()
+    gen_scheduler(prefix_args)
+    checkpoint_file = glob.glob(os.path.join(prefix_args.checkpoint_dir, "*_checkpoint.pkl"))[0]
+    print("Ran %.1f night prefix in %.1f min" % (prefix_nights, (time.time() - t0) / 60))
+
+    variant_args = copy.copy(args)
+    variant_args.prefix_from = checkpoint_file
+    return run_variants(specs, variant_args, n_workers=n_workers)
+
+
 def set_run_info(dbroot=None, file_end="v3.4_", out_dir="."):
     """Gather versions of software used to record"""
     extra_info = {}
@@ -1508,10 +2056,161 @@ def set_run_info(dbroot=None, file_end="v3.4_", out_dir="."):
     return fileroot, extra_info
 
 
+# Bump if the contents of checkpoint files change
+CHECKPOINT_VERSION = 4
+
+
+def save_checkpoint(filename, state):
+    """Write a simulation checkpoint
+
+    The state is pickled, since it holds the scheduler and observatory
+    objects. The observations are not in it, only the list of block
+    files written by `save_block_observations`, so each checkpoint costs
+    the same no matter how far into the survey it is. The file list is
+    saved relative to the checkpoint, so the directory can be moved.
+    It is written to a temporary file first so a job killed mid-write
+    leaves the previous checkpoint intact.
+    """
+    checkpoint_dir = os.path.dirname(os.path.abspath(filename))
+    state = dict(
+        state,
+        version=CHECKPOINT_VERSION,
+        observation_files=[os.path.relpath(name, checkpoint_dir) for name in state["observation_files"]],
+    )
+    temp_file = "%s.%i.tmp" % (filename, os.getpid())
+    with open(temp_file, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, filename)
+
+
+def load_checkpoint(filename):
+    """Read a checkpoint written by `save_checkpoint`
+
+    The observation_files in the returned state are absolute paths.
+    """
+    with open(filename, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            "Checkpoint %s has version %s, expected %i" % (filename, state.get("version"), CHECKPOINT_VERSION)
+        )
+    checkpoint_dir = os.path.dirname(os.path.abspath(filename))
+    state["observation_files"] = [os.path.join(checkpoint_dir, name) for name in state["observation_files"]]
+    return state
+
+
+def save_block_observations(filename, observations):
+    """Write the observations from one checkpoint block to a .npy file
+
+    Written before the checkpoint that lists it, and through a temporary
+    file, so a checkpoint never points at a missing or partial file.
+    """
+    temp_file = "%s.%i.tmp" % (filename, os.getpid())
+    with open(temp_file, "wb") as f:
+        np.save(f, observations, allow_pickle=False)
+    os.replace(temp_file, filename)
+
+
+def load_block_observations(filenames):
+    """Read block files from `save_block_observations`, as a list"""
+    return [np.load(name, allow_pickle=False) for name in filenames]
+
+
+def _fill_sim_runner_columns(observations, telescope="rubin"):
+    """Set alt, az, pa, pseudo_pa and rotTelPos the way sim_runner
+    does once its loop ends
+
+    For observations from block files, which are saved as the
+    observatory returned them.
+    """
+    lsst = rs_utils.Site("LSST")
+    rc = rs_utils.rotation_converter(telescope=telescope)
+    pa, alt, az = rs_utils.pseudo_parallactic_angle(
+        np.degrees(observations["RA"]),
+        np.degrees(observations["dec"]),
+        observations["mjd"],
+        lon=lsst.longitude,
+        lat=lsst.latitude,
+        height=lsst.height,
+    )
+    observations["alt"] = np.radians(alt)
+    observations["az"] = np.radians(az)
+    observations["pseudo_pa"] = np.radians(pa)
+    observations["rotTelPos"] = rc._rotskypos2rottelpos(observations["rotSkyPos"], observations["pseudo_pa"])
+    observations["pa"] = rs_utils._approx_altaz2pa(observations["alt"], observations["az"], lsst.latitude_rad)
+    return observations
+
+
+class _CheckpointHook:
+    """Save checkpoints from inside a sim_runner loop
+
+    sim_runner has no callback, so this wraps `observe` on the
+    observatory, to collect the completed observations and see when a
+    night starts, and `_check_queue_mjd_only` on the scheduler, which
+    sim_runner calls at the top of every pass through its loop. On the
+    first pass of the first night at or after next_mjd, save is called
+    with the observations since the last save, and returns the next
+    next_mjd. At that point every observation has been added to the
+    scheduler and the night's bands are mounted, which is the state a
+    new sim_runner call starts in, so carrying on from the checkpoint
+    gives the same result as not stopping.
+
+    Like `NightTelemetry`, the wrappers are on the instances, so they
+    are removed with `uninstall` before anything is pickled.
+    """
+
+    def __init__(self, save, next_mjd):
+        self.save = save
+        self.next_mjd = next_mjd
+        self.observations = []
+        self._observatory = None
+        self._night_mjd = None
+        self._patched = []
+
+    def _observe(self, func, *args, **kwargs):
+        result = func(*args, **kwargs)
+        if result[0] is not None:
+            self.observations.append(result[0])
+        if result[1]:
+            self._night_mjd = self._observatory.mjd
+        return result
+
+    def _check_queue_mjd_only(self, func, *args, **kwargs):
+        mjd = self._observatory.mjd
+        if (mjd >= self.next_mjd) and (mjd == self._night_mjd):
+            observations, self.observations = self.observations, []
+            self.next_mjd = self.save(observations)
+        return func(*args, **kwargs)
+
+    def _wrap_method(self, obj, name, handler):
+        func = getattr(obj, name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return handler(func, *args, **kwargs)
+
+        self._patched.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def install(self, scheduler, observatory):
+        self._observatory = observatory
+        self._wrap_method(scheduler, "_check_queue_mjd_only", self._check_queue_mjd_only)
+        self._wrap_method(observatory, "observe", self._observe)
+
+    def uninstall(self):
+        for obj, name, func in reversed(self._patched):
+            if func is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, func)
+        self._patched = []
+        self._observatory = None
+
+
 def run_sched(
     scheduler,
     survey_length=365.25,
-    nside=DEFAULT_NSIDE,
+    nside=None,
     filename=None,
     verbose=False,
     extra_info=None,
@@ -1520,17 +2219,184 @@ def run_sched(
     event_table=None,
     sim_to_o=None,
     snapshot_dir=None,
+    cloud_offset_year=None,
+    checkpoint_nights=None,
+    checkpoint_dir=".",
+    resume_from=None,
+    prefix_from=None,
+    profiler=None,
+    telemetry=None,
 ):
-    """Run survey"""
+    """Run survey
+
+    With checkpoint_nights set, the scheduler, observatory, and random
+    number state are saved to a checkpoint at the start of the first
+    night after every checkpoint_nights nights, and at the end, with
+    the observations since the last checkpoint written to their own
+    file. It is all one sim_runner call, so the output is the same as a
+    run without checkpoints. Passing the checkpoint as resume_from
+    carries on from there, and gives the same result as a run that was
+    never interrupted.
+
+    prefix_from is a checkpoint from a different variant that should
+    be used as the first part of this run. Its observations are fed to
+    `scheduler`, then the simulation continues from the checkpoint's
+    observatory out to survey_length.
+
+    Resuming or starting from a prefix reuses the checkpoint's
+    observatory, so nside, mjd_start, cloud_offset_year and the ToO
+    events have to match the ones it was made with, or a ValueError
+    is raised.
+
+    profiler is a `SchedulerProfiler` to install on the scheduler for
+    the run, and telemetry a `NightTelemetry` to record per-night
+    timing. The telemetry table is written to filename.
+    """
+    if ((profiler is not None) or (telemetry is not None)) and snapshot_dir:
+        raise ValueError("Can not profile or record telemetry and save scheduler snapshots in the same run")
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
+
     n_visit_limit = None
     fs = SimpleBandSched(illum_limit=illum_limit)
-    observatory = ModelObservatory(nside=nside, mjd_start=mjd_start, sim_to_o=sim_to_o)
+    observatory_kwargs = {}
+    if cloud_offset_year is not None:
+        observatory_kwargs["cloud_offset_year"] = cloud_offset_year
+    # What the observatory is built from, to check against checkpoints
+    observatory_settings = {
+        "nside": nside,
+        "mjd_start": mjd_start,
+        "cloud_offset_year": cloud_offset_year,
+        "too_events": None if event_table is None else hashlib.sha1(pickle.dumps(event_table)).hexdigest(),
+    }
+
+    if (resume_from is not None) or (prefix_from is not None):
+        from_file = prefix_from if resume_from is None else resume_from
+        state = load_checkpoint(from_file)
+        changed = [
+            key
+            for key in observatory_settings
+            if state["observatory_settings"][key] != observatory_settings[key]
+        ]
+        if changed:
+            raise ValueError(
+                "Checkpoint %s was run with a different %s, its observatory can't be reused"
+                % (from_file, ", ".join(changed))
+            )
+        observatory = state["observatory"]
+        fs = state["band_scheduler"]
+        np.random.set_state(state["numpy_random_state"])
+        random.setstate(state["random_state"])
+        # Observations from before the checkpoint, which go in the
+        # output ahead of the ones simulated here
+        earlier = load_block_observations(state["observation_files"])
+
+    if resume_from is not None:
+        scheduler = state["scheduler"]
+        if telemetry is not None:
+            telemetry.nights.update(state.get("telemetry", {}))
+        sim_duration = state["mjd_end"] - observatory.mjd
+    elif prefix_from is not None:
+        # All at once, the way rubin_scheduler's restore_scheduler does,
+        # rather than hundreds of thousands of add_observation calls
+        if len(earlier) > 0:
+            observations = np.concatenate(earlier)
+            scheduler.add_observations_array(observations)
+            scheduler.set_target_id_counter(np.max(observations["target_id"]) + 1)
+        state["mjd_end"] = state["sim_start_mjd"] + survey_length
+        state["checkpoint_nights"] = checkpoint_nights
+        sim_duration = state["mjd_end"] - observatory.mjd
+    else:
+        observatory = ModelObservatory(
+            nside=nside, mjd_start=mjd_start, sim_to_o=sim_to_o, **observatory_kwargs
+        )
+        state = {
+            "sim_start_mjd": observatory.mjd,
+            "mjd_end": observatory.mjd + survey_length,
+            "checkpoint_nights": checkpoint_nights,
+            "observation_files": [],
+            "observatory_settings": observatory_settings,
+        }
+        earlier = []
+        sim_duration = survey_length
+
+    if filename is None:
+        checkpoint_file = os.path.join(checkpoint_dir, "checkpoint.pkl")
+    else:
+        checkpoint_file = os.path.join(
+            checkpoint_dir, os.path.basename(filename).replace(".db", "_checkpoint.pkl")
+        )
+
+    def next_checkpoint_mjd():
+        # Checkpoints always follow the same nights, so a resumed run
+        # stops in the same places as one that was never interrupted
+        block = (observatory.mjd - state["sim_start_mjd"]) // state["checkpoint_nights"]
+        return state["sim_start_mjd"] + (block + 1) * state["checkpoint_nights"]
+
+    def save(observations):
+        if len(observations) > 0:
+            block_file = "%s_block%04i.npy" % (
+                os.path.splitext(checkpoint_file)[0],
+                len(state["observation_files"]),
+            )
+            save_block_observations(block_file, np.concatenate(observations))
+            state["observation_files"].append(block_file)
+        state.update(
+            {
+                "observatory": observatory,
+                "scheduler": scheduler,
+                "band_scheduler": fs,
+                "numpy_random_state": np.random.get_state(),
+                "random_state": random.getstate(),
+            }
+        )
+        if telemetry is not None:
+            state["telemetry"] = telemetry.nights
+        # The wrappers can't be pickled
+        uninstall()
+        save_checkpoint(checkpoint_file, state)
+        install()
+        if verbose:
+            print("\nSaved checkpoint at MJD %.2f to %s" % (observatory.mjd, checkpoint_file))
+        return next_checkpoint_mjd()
+
+    if state["checkpoint_nights"] is None:
+        checkpointer = None
+    elif snapshot_dir:
+        # The snapshots would pickle the checkpoint wrappers
+        raise ValueError("Can not save checkpoints and scheduler snapshots in the same run")
+    else:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpointer = _CheckpointHook(save, next_checkpoint_mjd())
+
+    def install():
+        if checkpointer is not None:
+            checkpointer.install(scheduler, observatory)
+        if profiler is not None:
+            profiler.install(scheduler)
+        if telemetry is not None:
+            telemetry.install(scheduler, observatory)
+
+    def uninstall():
+        # Reverse of install, so each removes its own wrappers
+        if telemetry is not None:
+            telemetry.uninstall()
+        if profiler is not None:
+            profiler.uninstall()
+        if checkpointer is not None:
+            checkpointer.uninstall()
+
+    earlier = [_fill_sim_runner_columns(observations) for observations in earlier]
+    if (filename is not None) and (len(earlier) > 0):
+        SchemaConverter().obs2opsim(np.concatenate(earlier), filename=filename, delete_past=True)
+
+    install()
     observatory, scheduler, observations = sim_runner(
         observatory,
         scheduler,
-        sim_duration=survey_length,
+        sim_duration=sim_duration,
         filename=filename,
-        delete_past=True,
+        delete_past=len(earlier) == 0,
         n_visit_limit=n_visit_limit,
         verbose=verbose,
         extra_info=extra_info,
@@ -1538,46 +2404,82 @@ def run_sched(
         event_table=event_table,
         snapshot_dir=snapshot_dir,
     )
-
+    if checkpointer is not None:
+        save(checkpointer.observations)
+    uninstall()
+    if (telemetry is not None) and (filename is not None):
+        telemetry.write(filename)
+
+    if len(earlier) > 0:
+        observations = np.concatenate(earlier + [observations])
     return observatory, scheduler, observations
 
 
-def gen_scheduler(args):
+def gen_scheduler(args, config=None):
+    """Build the scheduler, and run it unless args.setup_only is set
+
+    Parameters
+    ----------
+    args : `argparse.Namespace`
+        Arguments from `sched_argparser`.
+    config : `dict`
+        Strategy knobs from `strategy_config`. Default None builds them
+        from args.variant, args.config, and args.set.
+    """
+    if config is None:
+        config = strategy_config(
+            variant=args.variant, config_file=args.config, overrides=parse_overrides(args.set)
+        )
+
     survey_length = args.survey_length  # Days
     out_dir = args.out_dir
     verbose = args.verbose
     nexp = args.nexp
+    if config["nexp"] is not None:
+        nexp = config["nexp"]
     dbroot = args.dbroot
-    nside = args.nside
+    if dbroot is None:
+        dbroot = args.variant
+    nside = args.nside if args.preview is None else args.preview
+    if nside is None:
+        nside = rs_utils.DEFAULT_NSIDE
+    setup_cache_dir = args.setup_cache_dir
+    if args.no_setup_cache:
+        setup_cache_dir = None
     mjd_plus = args.mjd_plus
     split_long = args.split_long
     snapshot_dir = args.snapshot_dir
     too = not args.no_too
 
     # Parameters that were previously command-line
-    # arguments.
-    max_dither = 0.2  # Degrees. For DDFs
-    ddf_offseason_length = 365.25 * 0.2  # Amount of season not to use for DDFs
-    illum_limit = 40.0  # Percent. Lunar illumination used for band loading
-    u_exptime = 38.0  # Seconds
-    nslice = 2  # N slices for rolling
-    rolling_scale = 0.9  # Strength of rolling
-    rolling_uniform = True  # Should we use the uniform rolling flag
-    nights_off = 3  # For long gaps
-    ei_night_pattern = 4  # select doing earth interior observation every 4 nights
-    ei_bands = "riz"  # Bands to use for earth interior observations.
-    ei_repeat = 4  # Number of times to repeat earth interior observations
-    ei_am = 2.5  # Earth interior airmass limit
-    ei_elong_req = 45.0  # Solar elongation required for inner solar system
-    ei_area_req = 0.0  # Sky area required before attempting inner solar system
-    per_night = True  # Dither DDF per night
-    camera_ddf_rot_limit = 75.0  # degrees
+    # arguments. See STRATEGY_DEFAULTS.
+    max_dither = config["max_dither"]
+    ddf_offseason_length = config["ddf_offseason_length"]
+    illum_limit = config["illum_limit"]
+    u_exptime = config["u_exptime"]
+    nslice = config["nslice"]
+    rolling_scale = config["rolling_scale"]
+    rolling_uniform = config["rolling_uniform"]
+    nights_off = config["nights_off"]
+    ei_night_pattern = config["ei_night_pattern"]
+    ei_bands = config["ei_bands"]
+    ei_repeat = config["ei_repeat"]
+    ei_am = config["ei_am"]
+    ei_elong_req = config["ei_elong_req"]
+    ei_area_req = config["ei_area_req"]
+    per_night = config["per_night"]
+    camera_ddf_rot_limit = config["camera_ddf_rot_limit"]
+    cloud_offset_year = config["cloud_offset_year"]
 
     # Be sure to also update and regenerate DDF grid save file
     # if changing mjd_start
-    mjd_start = SURVEY_START_MJD + mjd_plus
+    mjd_start = rs_utils.SURVEY_START_MJD + mjd_plus
 
-    fileroot, extra_info = set_run_info(dbroot=dbroot, file_end="v4.3.5_", out_dir=out_dir)
+    file_end = config["file_end"].format(mjd_plus=int(mjd_plus), cloud_offset_year=cloud_offset_year)
+    if args.preview is not None:
+        # Keep previews from overwriting full resolution runs
+        file_end = "preview%i_%s" % (nside, file_end)
+    fileroot, extra_info = set_run_info(dbroot=dbroot, file_end=file_end, out_dir=out_dir)
 
     pattern_dict = {
         1: [True],
@@ -1593,8 +2495,15 @@ def gen_scheduler(args):
     ei_night_pattern = pattern_dict[ei_night_pattern]
     reverse_ei_night_pattern = [not val for val in ei_night_pattern]
 
-    sky = CurrentAreaMap(nside=nside)
-    footprints_hp_array, labels = sky.return_maps()
+    setup_arrays = cached_setup_arrays(
+        cache_dir=setup_cache_dir,
+        refresh=args.refresh_setup_cache,
+        nside=nside,
+        nexp=nexp,
+        ddf_offseason_length=ddf_offseason_length,
+    )
+    footprints_hp_array = setup_arrays["footprints_hp"]
+    labels = setup_arrays["labels"]
 
     wfd_indx = np.where((labels == "lowdust") | (labels == "virgo"))[0]
     wfd_footprint = footprints_hp_array["r"] * 0
@@ -1602,7 +2511,7 @@ def gen_scheduler(args):
 
     footprints_hp = {}
     for key in footprints_hp_array.dtype.names:
-        footprints_hp[key] = footprints_hp_array[key]
+        footprints_hp[key] = footprints_hp_array[key].copy()
 
     footprint_mask = footprints_hp["r"] * 0
     footprint_mask[np.where(footprints_hp["r"] > 0)] = 1
@@ -1614,6 +2523,9 @@ def gen_scheduler(args):
     sun_moon_info = almanac.get_sun_moon_positions(mjd_start)
     sun_ra_start = sun_moon_info["sun_RA"].copy()
 
+    rolling_kwargs = {}
+    if config["n_constant_start"] is not None:
+        rolling_kwargs["n_constant_start"] = config["n_constant_start"]
     footprints = make_rolling_footprints(
         fp_hp=footprints_hp,
         mjd_start=mjd_start,
@@ -1623,8 +2535,9 @@ def gen_scheduler(args):
         nside=nside,
         wfd_indx=wfd_indx,
         order_roll=1,
-        n_cycles=3,
+        n_cycles=config["n_cycles"],
         uniform=rolling_uniform,
+        **rolling_kwargs,
     )
 
     gaps_night_pattern = [True] + [False] * nights_off
@@ -1654,12 +2567,17 @@ def gen_scheduler(args):
         detailers.Rottep2RotspDesiredDetailer(),
         detailers.LabelRegionsAndDDFs(),
     ]
+    if config["ddf_generator"] is None:
+        ddf_obs = setup_arrays["ddf_obs"]
+    else:
+        ddf_obs = variant_ddf_obs(config["ddf_generator"], config["ddf_generator_kwargs"])
     ddfs = ddf_surveys(
         detailers=details,
         offseason_length=ddf_offseason_length,
         euclid_detailers=euclid_detailers,
         nside=nside,
         nexp=nexp,
+        obs_array=ddf_obs,
     )
 
     greedy = gen_greedy_surveys(nside, nexp=nexp, footprints=footprints)
@@ -1694,9 +2612,13 @@ def gen_scheduler(args):
         gen_roman_off_season(nexp=nexp, exptime=29.2),
     ]
 
+    extra_surveys = [
+        import_from_spec(spec)(nside, nexp=nexp, footprints=footprints) for spec in config["extra_surveys"]
+    ]
+
     if too:
-        too_scale = 1.0
-        sim_ToOs, event_table = gen_all_events(scale=too_scale, nside=nside)
+        too_scale = config["too_scale"]
+        sim_ToOs, event_table = too_events(scale=too_scale, nside=nside)
         camera_rot_limits = [-80.0, 80.0]
         detailer_list = []
         detailer_list.append(
@@ -1715,10 +2637,10 @@ def gen_scheduler(args):
             split_long=split_long,
             n_snaps=nexp,
         )
-        surveys = [toos, roman_surveys, ddfs, long_gaps, blobs, twi_blobs, neo, greedy]
+        surveys = [toos, roman_surveys, ddfs, long_gaps] + extra_surveys + [blobs, twi_blobs, neo, greedy]
 
     else:
-        surveys = [roman_surveys, ddfs, long_gaps, blobs, twi_blobs, neo, greedy]
+        surveys = [roman_surveys, ddfs, long_gaps] + extra_surveys + [blobs, twi_blobs, neo, greedy]
 
         sim_ToOs = None
         event_table = None
@@ -1730,11 +2652,14 @@ def gen_scheduler(args):
         return scheduler
     else:
         years = np.round(survey_length / 365.25)
+        filename = os.path.join(fileroot + "%iyrs.db" % years)
+        profiler = SchedulerProfiler() if args.profile else None
+        telemetry = NightTelemetry() if args.telemetry else None
         observatory, scheduler, observations = run_sched(
             scheduler,
             survey_length=survey_length,
             verbose=verbose,
-            filename=os.path.join(fileroot + "%iyrs.db" % years),
+            filename=filename,
             extra_info=extra_info,
             nside=nside,
             illum_limit=illum_limit,
@@ -1742,7 +2667,22 @@ def gen_scheduler(args):
             event_table=event_table,
             sim_to_o=sim_ToOs,
             snapshot_dir=snapshot_dir,
+            cloud_offset_year=cloud_offset_year,
+            checkpoint_nights=args.checkpoint_nights,
+            checkpoint_dir=args.checkpoint_dir,
+            resume_from=args.resume_from,
+            prefix_from=args.prefix_from,
+            profiler=profiler,
+            telemetry=telemetry,
         )
+        if profiler is not None:
+            profiler.write(filename)
+        if args.preview_compare is not None:
+            write_report(
+                filename,
+                args.preview_compare,
+                out_file=filename.replace(".db", "_preview_report.txt"),
+            )
         return observatory, scheduler, observations
 
 
@@ -1764,8 +2704,25 @@ def sched_argparser():
     parser.add_argument(
         "--nside",
         type=int,
-        default=DEFAULT_NSIDE,
-        help="Nside should be set to default (32) except for tests.",
+        default=None,
+        help="Nside should be left at the default (None, DEFAULT_NSIDE) except for tests. "
+        "Use --preview for quick low resolution runs.",
+    )
+    parser.add_argument(
+        "--preview",
+        type=int,
+        nargs="?",
+        const=16,
+        default=None,
+        choices=PREVIEW_NSIDES,
+        help="Run the scheduler at nside 16 (or the given nside) to quickly screen a variant. Only "
+        "the nside changes; sky brightness is still computed at full resolution",
+    )
+    parser.add_argument(
+        "--preview_compare",
+        type=str,
+        default=None,
+        help="Full resolution database to compare the run to, see preview_report.py",
     )
     parser.add_argument(
         "--mjd_plus",
@@ -1780,9 +2737,91 @@ def sched_argparser():
         help="Split long ToO exposures into standard visit lengths",
     )
     parser.add_argument("--snapshot_dir", type=str, default="", help="Directory for scheduler snapshots.")
+    parser.add_argument(
+        "--checkpoint_nights",
+        type=float,
+        default=None,
+        help="Save a checkpoint every this many nights",
+    )
+    parser.add_argument("--checkpoint_dir", type=str, default=".", help="Directory for checkpoints")
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        help="Time every survey and basis function, and write the results next to the output database",
+    )
+    parser.add_argument(
+        "--telemetry",
+        dest="telemetry",
+        action="store_true",
+        help="Write per-night throughput and latency to a telemetry table in the output database",
+    )
+    parser.set_defaults(profile=False, telemetry=False)
+    parser.add_argument(
+        "--resume_from",
+        type=str,
+        default=None,
+        help="Checkpoint file to continue a simulation from",
+    )
+    parser.add_argument(
+        "--prefix_from",
+        type=str,
+        default=None,
+        help="Checkpoint from another variant to use as the start of this run",
+    )
+    parser.add_argument(
+        "--prefix_nights",
+        type=float,
+        default=None,
+        help="With --variants_file, run this many nights once and fork the variants from there",
+    )
     parser.set_defaults(split_long=False)
     parser.add_argument("--no_too", dest="no_too", action="store_true")
     parser.set_defaults(no_too=False)
+    parser.add_argument(
+        "--setup_cache_dir",
+        type=str,
+        default=None,
+        help="Directory to cache footprints and DDF observations in. Default None, no cache",
+    )
+    parser.add_argument(
+        "--no_setup_cache",
+        dest="no_setup_cache",
+        action="store_true",
+        help="Always regenerate footprints and DDF observations, ignoring --setup_cache_dir",
+    )
+    parser.set_defaults(no_setup_cache=False)
+    parser.add_argument(
+        "--refresh_setup_cache",
+        dest="refresh_setup_cache",
+        action="store_true",
+        help="Regenerate footprints and DDF observations and overwrite the cached ones",
+    )
+    parser.set_defaults(refresh_setup_cache=False)
+    parser.add_argument(
+        "--variant",
+        type=str,
+        default=None,
+        help="Strategy variant to run, one of: %s" % ", ".join(VARIANTS),
+    )
+    parser.add_argument("--config", type=str, default=None, help="TOML file of strategy knobs")
+    parser.add_argument(
+        "--set",
+        type=str,
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Set a strategy knob, e.g., --set nslice=3. Can be repeated.",
+    )
+    parser.add_argument(
+        "--variants_file",
+        type=str,
+        default=None,
+        help="TOML file listing variants to run, see load_variant_specs",
+    )
+    parser.add_argument(
+        "--n_workers", type=int, default=1, help="Variants to run at once with --variants_file"
+    )
 
     return parser
 
@@ -1790,4 +2829,9 @@ def sched_argparser():
 if __name__ == "__main__":
     parser = sched_argparser()
     args = parser.parse_args()
-    gen_scheduler(args)
+    if (args.variants_file is not None) and (args.prefix_nights is not None):
+        run_fanout(load_variant_specs(args.variants_file), args, args.prefix_nights, n_workers=args.n_workers)
+    elif args.variants_file is not None:
+        run_variants(load_variant_specs(args.variants_file), args, n_workers=args.n_workers)
+    else:
+        gen_scheduler(args)
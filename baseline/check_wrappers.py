@@ -0,0 +1,120 @@
+"""Check SchedulerProfiler and NightTelemetry can be used together.
+
+Both wrap request_observation on the scheduler instance. They are
+installed and removed the way run_sched does it, once per checkpoint
+block, on a small stand-in scheduler, survey and observatory. Checks
+both saw every call, and that afterwards the instances and basis
+function class are back to what they were.
+
+python check_wrappers.py
+"""
+
+import argparse
+
+import numpy as np
+
+from sched_profile import SchedulerProfiler
+from sched_telemetry import NightTelemetry
+
+
+class _Almanac:
+    def get_sunset_info(self, mjd):
+        return {"night": int(mjd)}
+
+
+class _Observatory:
+    def __init__(self):
+        self.mjd = 0.0
+        self.almanac = _Almanac()
+
+    def observe(self, observation):
+        self.mjd += 0.25
+        return observation, True
+
+
+class _BasisFunction:
+    def __call__(self, conditions):
+        return 1.0
+
+
+class _Survey:
+    survey_name = "survey"
+
+    def __init__(self):
+        self.basis_functions = [_BasisFunction()]
+
+    def calc_reward_function(self, conditions):
+        return sum(basis_function(conditions) for basis_function in self.basis_functions)
+
+    def generate_observations(self, conditions):
+        return [np.zeros(1)]
+
+
+class _Scheduler:
+    def __init__(self):
+        self.survey_lists = [[_Survey()]]
+        self.flushed = 0
+
+    def request_observation(self, mjd=None):
+        survey = self.survey_lists[0][0]
+        survey.calc_reward_function(None)
+        return survey.generate_observations(None)[0]
+
+    def flush_queue(self):
+        self.flushed += 1
+
+
+def _instance_state(scheduler, observatory):
+    """Names set on the instances the wrappers change"""
+    return [set(vars(obj)) for obj in (scheduler, scheduler.survey_lists[0][0], observatory)]
+
+
+def check_together(n_blocks=3, nights_per_block=2):
+    """Run with both installed, in blocks like a checkpointed run
+
+    Returns
+    -------
+    n_requests : `int`
+        Number of requests made.
+    """
+    scheduler = _Scheduler()
+    observatory = _Observatory()
+    before = _instance_state(scheduler, observatory)
+    bf_call = _BasisFunction.__dict__["__call__"]
+    profiler = SchedulerProfiler()
+    telemetry = NightTelemetry()
+
+    n_requests = 0
+    for block in range(n_blocks):
+        # Same order as run_sched
+        profiler.install(scheduler)
+        telemetry.install(scheduler, observatory)
+        while observatory.mjd < (block + 1) * nights_per_block:
+            observatory.observe(scheduler.request_observation(mjd=observatory.mjd))
+            scheduler.flush_queue()
+            n_requests += 1
+        telemetry.uninstall()
+        profiler.uninstall()
+
+        assert _instance_state(scheduler, observatory) == before
+        assert _BasisFunction.__dict__["__call__"] is bf_call
+
+    table = telemetry.table()
+    assert table["n_requests"].sum() == n_requests
+    assert table["n_obs"].sum() == n_requests
+    assert table["n_flush"].sum() == n_requests
+    assert profiler.stats["request_observation"].calls == n_requests
+    assert profiler.stats["0.0 survey bf0 _BasisFunction"].calls == n_requests
+    return n_requests
+
+
+def check_argparser():
+    parser = argparse.ArgumentParser(description="Check the profiler and telemetry wrappers together")
+    parser.add_argument("--n_blocks", type=int, default=3)
+    return parser
+
+
+if __name__ == "__main__":
+    args = check_argparser().parse_args()
+    n_requests = check_together(n_blocks=args.n_blocks)
+    print("profiler and telemetry together: %i requests in %i blocks, ok" % (n_requests, args.n_blocks))
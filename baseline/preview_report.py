@@ -0,0 +1,131 @@
+"""Compare a reduced resolution preview run to a full resolution run.
+
+python preview_report.py baseline_preview16_v4.3.5_1yrs.db baseline_v4.3.5_1yrs.db
+"""
+
+__all__ = ("summary_metrics", "compare_summaries", "write_report")
+
+import argparse
+import sqlite3
+
+import healpy as hp
+import numpy as np
+import pandas as pd
+
+BANDS = "ugrizy"
+
+
+def summary_metrics(filename, nside=16):
+    """Summary metrics of a simulated survey
+
+    Parameters
+    ----------
+    filename : `str`
+        Output database from `run_sched`.
+    nside : `int`
+        Sky coverage is counted on HEALpix of this nside, so runs at
+        different resolutions are compared on the same pixels.
+
+    Returns
+    -------
+    metrics : `dict`
+        Metric name: value.
+    """
+    with sqlite3.connect(filename) as con:
+        visits = pd.read_sql("select * from observations", con)
+    band_col = "band" if "band" in visits else "filter"
+
+    n_nights = visits["night"].nunique()
+    same_night = visits["night"].values[1:] == visits["night"].values[:-1]
+    band_change = visits[band_col].values[1:] != visits[band_col].values[:-1]
+
+    metrics = {
+        "n_visits": len(visits),
+        "n_nights": n_nights,
+        "open_shutter_fraction": visits["visitExposureTime"].sum()
+        / (visits["visitTime"].sum() + visits["slewTime"].sum()),
+        "median_slew_time": visits["slewTime"].median(),
+        "median_airmass": visits["airmass"].median(),
+        "median_seeing": visits["seeingFwhmEff"].median(),
+        "band_changes_per_night": np.sum(same_night & band_change) / max(n_nights, 1),
+        "ddf_fraction": visits["scheduler_note"].str.startswith("DD").mean(),
+    }
+    npix = hp.nside2npix(nside)
+    for band in BANDS:
+        in_band = visits[band_col] == band
+        metrics["fraction_%s" % band] = in_band.mean()
+        metrics["median_m5_%s" % band] = visits["fiveSigmaDepth"][in_band].median()
+        hpid = hp.ang2pix(
+            nside, visits["fieldRA"][in_band].values, visits["fieldDec"][in_band].values, lonlat=True
+        )
+        counts = np.bincount(hpid, minlength=npix)
+        covered = counts > 0
+        metrics["area_%s" % band] = np.sum(covered) * hp.nside2pixarea(nside, degrees=True)
+        metrics["median_visits_%s" % band] = np.median(counts[covered]) if np.any(covered) else 0.0
+
+    return metrics
+
+
+def compare_summaries(preview, full, tolerance=0.1):
+    """Table of preview and full resolution metrics
+
+    Parameters
+    ----------
+    preview, full : `dict`
+        Metrics from `summary_metrics`.
+    tolerance : `float`
+        Fractional difference to flag.
+
+    Returns
+    -------
+    comparison : `pandas.DataFrame`
+        Preview and full values, their ratio, and whether the ratio is
+        outside tolerance, indexed by metric name.
+    """
+    comparison = pd.DataFrame({"preview": pd.Series(preview), "full": pd.Series(full)})
+    with np.errstate(divide="ignore", invalid="ignore"):
+        comparison["ratio"] = comparison["preview"] / comparison["full"]
+    comparison["flag"] = ~(np.abs(comparison["ratio"] - 1) <= tolerance)
+    return comparison
+
+
+def write_report(preview_file, full_file, out_file=None, tolerance=0.1, nside=16):
+    """Compare two output databases and print (and save) the result
+
+    Returns
+    -------
+    comparison : `pandas.DataFrame`
+        See `compare_summaries`.
+    """
+    comparison = compare_summaries(
+        summary_metrics(preview_file, nside=nside),
+        summary_metrics(full_file, nside=nside),
+        tolerance=tolerance,
+    )
+    lines = [
+        "preview: %s" % preview_file,
+        "full: %s" % full_file,
+        "%-28s %14s %14s %8s" % ("metric", "preview", "full", "ratio"),
+    ]
+    for name, row in comparison.iterrows():
+        line = "%-28s %14.6g %14.6g %8.3f" % (name, row["preview"], row["full"], row["ratio"])
+        if row["flag"]:
+            line += "  differs by more than %i%%" % (tolerance * 100)
+        lines.append(line)
+    text = "\n".join(lines) + "\n"
+    print(text)
+    if out_file is not None:
+        with open(out_file, "w") as f:
+            f.write(text)
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a preview run to a full resolution run")
+    parser.add_argument("preview_file", type=str, help="Output database from a --preview run")
+    parser.add_argument("full_file", type=str, help="Output database from a full resolution run")
+    parser.add_argument("--out_file", type=str, default=None, help="Also write the report here")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Fractional difference to flag")
+    parser.add_argument("--nside", type=int, default=16, help="nside to compare sky coverage at")
+    args = parser.parse_args()
+    write_report(args.preview_file, args.full_file, args.out_file, tolerance=args.tolerance, nside=args.nside)
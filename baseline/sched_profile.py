@@ -0,0 +1,233 @@
+__all__ = ("SchedulerProfiler",)
+
+import functools
+import math
+import time
+
+import numpy as np
+
+# Per-call latency histogram bins, 10 per decade from 100 ns to 100 s
+_LOG_MIN = -7.0
+_BINS_PER_DECADE = 10
+_N_BINS = 9 * _BINS_PER_DECADE + 1
+
+
+class _Stats:
+    """Timing accumulated for one profiled function"""
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.hist = np.zeros(_N_BINS, dtype=np.int64)
+        self.nightly = {}
+
+    def percentile(self, q):
+        """Approximate per-call percentile (seconds) from the histogram"""
+        if self.calls == 0:
+            return np.nan
+        indx = np.searchsorted(np.cumsum(self.hist), q / 100.0 * self.calls)
+        return 10.0 ** (_LOG_MIN + (indx + 1.0) / _BINS_PER_DECADE)
+
+
+class SchedulerProfiler:
+    """Time the surveys and basis functions of a scheduler
+
+    Wraps `request_observation` on the scheduler, `calc_reward_function`
+    and `generate_observations` on every survey, and `__call__` on every
+    basis function. Records call counts, total and self time, per-call
+    latency percentiles, and per-night totals for each of them, plus
+    the call stacks for a flamegraph.
+
+    Basis functions are wrapped at the class level, since python looks
+    up ``__call__`` on the type. `uninstall` puts everything back.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.stacks = {}
+        self.night = -1
+        # Entries are [label, time spent in children]
+        self._stack = []
+        self._bf_labels = {}
+        self._patched_instances = []
+        self._patched_classes = {}
+
+    def _record(self, label, func, args, kwargs):
+        if len(self._stack) > 0 and self._stack[-1][0] == label:
+            # A basis function calling its parent class __call__
+            return func(*args, **kwargs)
+        for arg in args:
+            night = getattr(arg, "night", None)
+            if night is not None:
+                self.night = night
+                break
+
+        self._stack.append([label, 0.0])
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - t0
+            frame = self._stack.pop()
+            path = ";".join([entry[0] for entry in self._stack] + [label])
+            self.stacks[path] = self.stacks.get(path, 0.0) + elapsed - frame[1]
+            if len(self._stack) > 0:
+                self._stack[-1][1] += elapsed
+
+            stats = self.stats.get(label)
+            if stats is None:
+                stats = self.stats[label] = _Stats()
+            stats.calls += 1
+            stats.total += elapsed
+            stats.self_time += elapsed - frame[1]
+            if elapsed > 0:
+                indx = int((math.log10(elapsed) - _LOG_MIN) * _BINS_PER_DECADE)
+                stats.hist[min(max(indx, 0), _N_BINS - 1)] += 1
+            else:
+                stats.hist[0] += 1
+            stats.nightly[self.night] = stats.nightly.get(self.night, 0.0) + elapsed
+
+    def _wrap_method(self, obj, name, label):
+        func = getattr(obj, name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self._record(label, func, args, kwargs)
+
+        # Whatever was on the instance before (e.g. another wrapper),
+        # for uninstall to put back
+        self._patched_instances.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def _wrap_bf_class(self, cls):
+        if cls in self._patched_classes:
+            return
+        func = cls.__call__
+        self._patched_classes[cls] = cls.__dict__.get("__call__")
+        profiler = self
+
+        @functools.wraps(func)
+        def wrapper(bf_self, *args, **kwargs):
+            label = profiler._bf_labels.get(id(bf_self), type(bf_self).__name__)
+            return profiler._record(label, func, (bf_self,) + args, kwargs)
+
+        cls.__call__ = wrapper
+
+    def install(self, scheduler):
+        """Wrap the scheduler, its surveys and their basis functions
+
+        Parameters
+        ----------
+        scheduler : `rubin_scheduler.scheduler.schedulers.CoreScheduler`
+            The scheduler to profile.
+        """
+        self._wrap_method(scheduler, "request_observation", "request_observation")
+        for i, survey_list in enumerate(scheduler.survey_lists):
+            for j, survey in enumerate(survey_list):
+                survey_label = "%i.%i %s" % (i, j, getattr(survey, "survey_name", type(survey).__name__))
+                self._wrap_method(survey, "calc_reward_function", survey_label + " calc_reward_function")
+                self._wrap_method(survey, "generate_observations", survey_label + " generate_observations")
+                for k, basis_function in enumerate(getattr(survey, "basis_functions", [])):
+                    self._bf_labels.setdefault(
+                        id(basis_function), "%s bf%i %s" % (survey_label, k, type(basis_function).__name__)
+                    )
+                    self._wrap_bf_class(type(basis_function))
+
+    def uninstall(self):
+        """Remove all the wrappers
+
+        Each method is put back to what it was at install time, so
+        wrappers other tools added before `install` stay in place.
+        """
+        for obj, name, func in reversed(self._patched_instances):
+            if func is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, func)
+        for cls, func in self._patched_classes.items():
+            if func is None:
+                del cls.__call__
+            else:
+                cls.__call__ = func
+        self._patched_instances = []
+        self._patched_classes = {}
+
+    def summary(self):
+        """Summary table, one row per profiled function
+
+        Returns
+        -------
+        summary : `np.array`
+            Columns are label, calls, total and self time (s),
+            p50 and p99 time per call (s), and p50 and p99 time
+            per night (s). Sorted by total time.
+        """
+        dtype = [
+            ("label", "U200"),
+            ("calls", int),
+            ("total", float),
+            ("self", float),
+            ("call_p50", float),
+            ("call_p99", float),
+            ("night_p50", float),
+            ("night_p99", float),
+        ]
+        result = np.zeros(len(self.stats), dtype=dtype)
+        for i, (label, stats) in enumerate(self.stats.items()):
+            nightly = np.array(list(stats.nightly.values()))
+            result[i] = (
+                label,
+                stats.calls,
+                stats.total,
+                stats.self_time,
+                stats.percentile(50),
+                stats.percentile(99),
+                np.percentile(nightly, 50),
+                np.percentile(nightly, 99),
+            )
+        return result[np.argsort(result["total"])[::-1]]
+
+    def write(self, filename):
+        """Write the summary table and flamegraph stacks
+
+        Parameters
+        ----------
+        filename : `str`
+            The output database name. Writes <name>_profile.txt, a
+            text table, and <name>_profile.folded, self time per call
+            stack in microseconds, for flamegraph.pl or speedscope.
+        """
+        fileroot = filename.replace(".db", "")
+        summary = self.summary()
+        with open(fileroot + "_profile.txt", "w") as f:
+            f.write(
+                "%10s %12s %12s %12s %12s %12s %12s  %s\n"
+                % (
+                    "calls",
+                    "total (s)",
+                    "self (s)",
+                    "p50 (ms)",
+                    "p99 (ms)",
+                    "p50/night",
+                    "p99/night",
+                    "function",
+                )
+            )
+            for row in summary:
+                f.write(
+                    "%10i %12.2f %12.2f %12.4f %12.4f %12.3f %12.3f  %s\n"
+                    % (
+                        row["calls"],
+                        row["total"],
+                        row["self"],
+                        row["call_p50"] * 1e3,
+                        row["call_p99"] * 1e3,
+                        row["night_p50"],
+                        row["night_p99"],
+                        row["label"],
+                    )
+                )
+        with open(fileroot + "_profile.folded", "w") as f:
+            for path, self_time in sorted(self.stacks.items()):
+                f.write("%s %i\n" % (path, round(self_time * 1e6)))
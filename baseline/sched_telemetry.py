@@ -0,0 +1,149 @@
+__all__ = ("NightTelemetry",)
+
+import functools
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class NightTelemetry:
+    """Per-night throughput and latency of a simulation
+
+    Wraps `request_observation` and `flush_queue` on the scheduler and
+    `observe` on the observatory. For each night records the wall time,
+    number of requests and completed observations, time spent in the
+    scheduler and the observatory, and queue flushes.
+
+    The wrappers are set on the instances, so they have to be removed
+    with `uninstall` before the scheduler or observatory are pickled.
+    The accumulated numbers are kept, and `install` can be called
+    again to carry on.
+    """
+
+    columns = (
+        "night",
+        "mjd_start",
+        "wall_time",
+        "n_requests",
+        "n_obs",
+        "request_time",
+        "observe_time",
+        "n_flush",
+        "n_flushed",
+    )
+
+    def __init__(self):
+        # night: row dict
+        self.nights = {}
+        self._observatory = None
+        self._scheduler = None
+        self._patched = []
+        self._night = None
+        self._t_last = None
+
+    def _row(self, night):
+        row = self.nights.get(night)
+        if row is None:
+            row = dict.fromkeys(self.columns, 0)
+            row["night"] = night
+            row["mjd_start"] = self._observatory.mjd
+            row["wall_time"] = 0.0
+            row["request_time"] = 0.0
+            row["observe_time"] = 0.0
+            self.nights[night] = row
+        return row
+
+    def _request_observation(self, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        # Everything from one request to the next (observing, adding
+        # observations, band changes, etc) goes to the night it was
+        # made on
+        if self._night is not None:
+            self.nights[self._night]["wall_time"] += t0 - self._t_last
+        self._t_last = t0
+        self._night = int(self._observatory.almanac.get_sunset_info(self._observatory.mjd)["night"])
+        row = self._row(self._night)
+        flushed = getattr(self._scheduler, "flushed", 0)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            row["request_time"] += time.perf_counter() - t0
+            row["n_requests"] += 1
+            row["n_flushed"] += getattr(self._scheduler, "flushed", 0) - flushed
+
+    def _observe(self, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        if self._night is not None:
+            row = self.nights[self._night]
+            row["observe_time"] += time.perf_counter() - t0
+            if result[0] is not None:
+                row["n_obs"] += np.size(result[0])
+        return result
+
+    def _flush_queue(self, func, *args, **kwargs):
+        if self._night is not None:
+            self.nights[self._night]["n_flush"] += 1
+        return func(*args, **kwargs)
+
+    def _wrap_method(self, obj, name, handler):
+        func = getattr(obj, name, None)
+        if func is None:
+            return
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return handler(func, *args, **kwargs)
+
+        # Put back by uninstall, in case it is another tool's wrapper
+        self._patched.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def install(self, scheduler, observatory):
+        """Start recording
+
+        Parameters
+        ----------
+        scheduler : `rubin_scheduler.scheduler.schedulers.CoreScheduler`
+            The scheduler being run.
+        observatory : `rubin_scheduler.scheduler.model_observatory.ModelObservatory`
+            The observatory being run.
+        """
+        self._scheduler = scheduler
+        self._observatory = observatory
+        self._night = None
+        self._wrap_method(scheduler, "request_observation", self._request_observation)
+        self._wrap_method(scheduler, "flush_queue", self._flush_queue)
+        self._wrap_method(observatory, "observe", self._observe)
+
+    def uninstall(self):
+        """Remove the wrappers, restoring what was there at install"""
+        if self._night is not None:
+            self.nights[self._night]["wall_time"] += time.perf_counter() - self._t_last
+        for obj, name, func in reversed(self._patched):
+            if func is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, func)
+        self._patched = []
+        self._scheduler = None
+        self._observatory = None
+        self._night = None
+
+    def table(self):
+        """Telemetry as a DataFrame, one row per night"""
+        return pd.DataFrame([self.nights[night] for night in sorted(self.nights)], columns=self.columns)
+
+    def write(self, filename):
+        """Write the telemetry table to an output database
+
+        Parameters
+        ----------
+        filename : `str`
+            The database written by the simulation. A ``telemetry``
+            table is added, replacing any that is already there.
+        """
+        with sqlite3.connect(filename) as con:
+            self.table().to_sql("telemetry", con, if_exists="replace", index=False)
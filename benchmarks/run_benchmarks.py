@@ -0,0 +1,275 @@
+"""Benchmarks for the survey strategy scripts.
+
+Each scenario runs in its own process with fixed random seeds, and
+records wall time, peak memory, and the number of observations made.
+Results are saved per machine and commit in results/, so runs on
+different branches or machines can be compared with --compare.
+
+python run_benchmarks.py
+python run_benchmarks.py --scenarios baseline_1night ddf_presched
+python run_benchmarks.py --long --compare main
+"""
+
+__all__ = ("SCENARIOS", "run_scenario", "run_benchmarks", "compare_results")
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SEED = 42
+
+
+def _baseline_run(survey_length):
+    """Run baseline.py for survey_length days"""
+    sys.path.insert(0, os.path.join(REPO_DIR, "baseline"))
+    import baseline
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        args = baseline.sched_argparser().parse_args(
+            [
+                "--survey_length",
+                str(survey_length),
+                "--out_dir",
+                out_dir,
+                "--dbroot",
+                "bench",
+                "--no_setup_cache",
+            ]
+        )
+        observations = baseline.gen_scheduler(args)[2]
+    return np.size(observations)
+
+
+def _scheduler_build():
+    """Construct the baseline scheduler without running it"""
+    sys.path.insert(0, os.path.join(REPO_DIR, "baseline"))
+    import baseline
+
+    args = baseline.sched_argparser().parse_args(["--setup_only", "--no_setup_cache"])
+    baseline.gen_scheduler(args)
+    return 0
+
+
+def _footprint_build():
+    """Make the baseline footprints and rolling footprints"""
+    from rubin_scheduler.scheduler.utils import CurrentAreaMap, make_rolling_footprints
+    from rubin_scheduler.site_models import Almanac
+    from rubin_scheduler.utils import DEFAULT_NSIDE, SURVEY_START_MJD
+
+    sky = CurrentAreaMap(nside=DEFAULT_NSIDE)
+    footprints_hp_array, labels = sky.return_maps()
+    wfd_indx = np.where((labels == "lowdust") | (labels == "virgo"))[0]
+    footprints_hp = {key: footprints_hp_array[key] for key in footprints_hp_array.dtype.names}
+    almanac = Almanac(mjd_start=SURVEY_START_MJD)
+    sun_ra_start = almanac.get_sun_moon_positions(SURVEY_START_MJD)["sun_RA"].copy()
+    make_rolling_footprints(
+        fp_hp=footprints_hp,
+        mjd_start=SURVEY_START_MJD,
+        sun_ra_start=sun_ra_start,
+        nslice=2,
+        scale=0.9,
+        nside=DEFAULT_NSIDE,
+        wfd_indx=wfd_indx,
+        order_roll=1,
+        n_cycles=3,
+        uniform=True,
+    )
+    return 0
+
+
+def _ddf_presched():
+    """Generate the ocean6 DDF pre-schedule"""
+    ddf_dir = os.path.join(REPO_DIR, "ddf_ocean")
+    sys.path.insert(0, ddf_dir)
+    from ddf_presched import generate_ddf_scheduled_obs
+
+    obs = generate_ddf_scheduled_obs(ddf_config_file=os.path.join(ddf_dir, "ocean6.dat"))
+    return np.size(obs)
+
+
+def _startup_import():
+    """Start python and import baseline.py, as a notebook would"""
+    subprocess.check_call([sys.executable, "-c", "import baseline"], cwd=os.path.join(REPO_DIR, "baseline"))
+    return 0
+
+
+# name: (function, arguments, long running)
+SCENARIOS = {
+    "baseline_1night": (_baseline_run, (1.0,), False),
+    "baseline_1week": (_baseline_run, (7.0,), False),
+    "baseline_60day": (_baseline_run, (60.0,), False),
+    "baseline_1year": (_baseline_run, (365.25,), True),
+    "scheduler_build": (_scheduler_build, (), False),
+    "footprint_build": (_footprint_build, (), False),
+    "ddf_presched": (_ddf_presched, (), False),
+    # Should stay under 1 s
+    "startup_import": (_startup_import, (), False),
+}
+
+
+def run_scenario(name):
+    """Run one scenario in this process
+
+    Returns
+    -------
+    result : `dict`
+        Wall time (s), peak memory (MB), number of observations, and
+        observations per second.
+    """
+    func, func_args, _ = SCENARIOS[name]
+    np.random.seed(SEED)
+    t0 = time.perf_counter()
+    n_obs = func(*func_args)
+    wall_time = time.perf_counter() - t0
+    return {
+        "wall_time": wall_time,
+        # ru_maxrss is in kilobytes on linux
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "n_obs": int(n_obs),
+        "obs_per_sec": n_obs / wall_time,
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.check_output(["git"] + list(args), cwd=REPO_DIR, text=True).strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def run_benchmarks(names, results_dir=RESULTS_DIR):
+    """Run scenarios, each in a fresh process, and save the results
+
+    Parameters
+    ----------
+    names : `list` of `str`
+        Keys of `SCENARIOS` to run.
+    results_dir : `str`
+        Results are written to results_dir/<machine>/<commit>.json.
+
+    Returns
+    -------
+    record : `dict`
+        The saved record.
+    """
+    try:
+        import rubin_scheduler
+
+        rs_version = rubin_scheduler.__version__
+    except ImportError:
+        rs_version = None
+
+    commit = _git("rev-parse", "HEAD") or "unknown"
+    record = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "rubin_scheduler": rs_version,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {},
+    }
+
+    # spawn, so every scenario pays its own imports and has its own
+    # peak memory
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_scenario, (name,))
+        record["results"][name] = result
+        print(
+            "%-20s %10.2f s %10.0f MB %10i obs %10.1f obs/s"
+            % (name, result["wall_time"], result["max_rss_mb"], result["n_obs"], result["obs_per_sec"])
+        )
+
+    out_dir = os.path.join(results_dir, record["machine"])
+    os.makedirs(out_dir, exist_ok=True)
+    out_file = os.path.join(out_dir, "%s%s.json" % (commit[:10], "-dirty" if record["dirty"] else ""))
+    with open(out_file, "w") as f:
+        json.dump(record, f, indent=2)
+    print("Wrote %s" % out_file)
+    return record
+
+
+def compare_results(record, other, threshold=0.1):
+    """Print how record compares to another saved record
+
+    Parameters
+    ----------
+    record, other : `dict`
+        Records from `run_benchmarks`.
+    threshold : `float`
+        Fractional slowdown or memory growth to flag as a regression.
+
+    Returns
+    -------
+    regressions : `list` of `str`
+        Scenarios that got slower or bigger by more than threshold.
+    """
+    print("Compared to %s on %s" % (other["commit"][:10], other["machine"]))
+    print("%-20s %12s %12s %12s" % ("scenario", "time ratio", "RSS ratio", "n_obs diff"))
+    regressions = []
+    for name, result in record["results"].items():
+        if name not in other["results"]:
+            continue
+        old = other["results"][name]
+        time_ratio = result["wall_time"] / old["wall_time"]
+        rss_ratio = result["max_rss_mb"] / old["max_rss_mb"]
+        line = "%-20s %12.2f %12.2f %12i" % (name, time_ratio, rss_ratio, result["n_obs"] - old["n_obs"])
+        if (time_ratio > 1 + threshold) or (rss_ratio > 1 + threshold):
+            line += "  REGRESSION"
+            regressions.append(name)
+        print(line)
+    return regressions
+
+
+def _find_record(commit, machine, results_dir=RESULTS_DIR):
+    """Saved record for a commit (or anything git rev-parse takes)"""
+    commit = _git("rev-parse", commit) or commit
+    files = glob.glob(os.path.join(results_dir, machine, "%s*.json" % commit[:10]))
+    if len(files) == 0:
+        raise ValueError("No benchmark results for %s on %s" % (commit, machine))
+    with open(sorted(files)[0]) as f:
+        return json.load(f)
+
+
+def bench_argparser():
+    parser = argparse.ArgumentParser(description="Run the strategy benchmarks")
+    parser.add_argument(
+        "--scenarios", type=str, nargs="+", default=None, help="Scenarios to run: %s" % ", ".join(SCENARIOS)
+    )
+    parser.add_argument("--long", dest="long", action="store_true", help="Include the long scenarios")
+    parser.add_argument("--compare", type=str, default=None, help="Commit to compare to")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Fractional slowdown to flag")
+    parser.add_argument("--results_dir", type=str, default=RESULTS_DIR)
+    return parser
+
+
+if __name__ == "__main__":
+    args = bench_argparser().parse_args()
+    names = args.scenarios
+    if names is None:
+        names = [name for name, (_, _, long_run) in SCENARIOS.items() if args.long or not long_run]
+
+    # Load the comparison first, it may be for this commit
+    other = None
+    if args.compare is not None:
+        other = _find_record(args.compare, platform.node(), args.results_dir)
+
+    record = run_benchmarks(names, results_dir=args.results_dir)
+    if other is not None:
+        regressions = compare_results(record, other, threshold=args.threshold)
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -11,6 +11,18 @@ from rubin_scheduler.site_models import Almanac
 from rubin_scheduler.utils import SURVEY_START_MJD, calc_season, ddf_locations
 
 
+def _find_free(parent, indx):
+    """Find the smallest free slot >= indx in a union-find "next free
+    slot" structure, compressing the path along the way.
+    """
+    root = indx
+    while parent[root] != root:
+        root = parent[root]
+    while parent[indx] != root:
+        parent[indx], indx = root, parent[indx]
+    return root
+
+
 def match_cumulative(cumulative_desired, mask=None, no_duplicate=True):
     """Generate a schedule that tries to match the desired cumulative
     distribution given a mask
@@ -37,33 +49,53 @@ def match_cumulative(cumulative_desired, mask=None, no_duplicate=True):
     if mask is None:
         mask = np.ones(sched.size)
 
-    valid = np.where(mask > 0)[0].tolist()
-    x = np.arange(sched.size)
+    valid = np.where(mask > 0)[0]
 
     drd = np.diff(rounded_desired)
     step_points = np.where(drd > 0)[0] + 1
 
-    # would be nice to eliminate this loop, but it's not too bad.
-    # can't just use searchsorted on the whole array, because then there
-    # can be duplicate values, and array[[n,n]] = 1 means that extra
-    # match gets lost.
-    for indx in step_points:
-        left = np.searchsorted(x[valid], indx)
-        right = np.searchsorted(x[valid], indx, side="right")
-        d1 = indx - left
-        d2 = right - indx
-        if d1 < d2:
-            sched_at = left
-        else:
-            sched_at = right
-
-        # If we are off the end
-        if sched_at >= len(valid):
-            sched_at -= 1
-
-        sched[valid[sched_at]] += 1
-        if no_duplicate:
-            valid.pop(sched_at)
+    # Each step point goes to the first valid element at or after it,
+    # or the one after that if the step lands on a valid element that
+    # has a gap somewhere before it. Off the end, take the last valid one.
+    if not no_duplicate:
+        left = np.searchsorted(valid, step_points)
+        right = np.searchsorted(valid, step_points, side="right")
+        sched_at = np.where(step_points - left < right - step_points, left, right)
+        sched_at[sched_at >= valid.size] -= 1
+        np.add.at(sched, valid[sched_at], 1)
+        return sched
+
+    # With no duplicates, valid elements get used up as we go. Track the
+    # free elements with a union-find "next free slot" structure so each
+    # step point is O(1) amortized rather than rebuilding the valid list.
+    n = sched.size
+    free = np.zeros(n, dtype=bool)
+    free[valid] = True
+    free = free.tolist()
+    parent = [i if free[i] else i + 1 for i in range(n)] + [n]
+    # Smallest element that is not free. Only ever decreases.
+    first_gap = free.index(False) if False in free else n
+    # Largest element that is still free. Only ever decreases.
+    last = int(valid[-1]) if valid.size > 0 else -1
+
+    for indx in step_points.tolist():
+        sched_at = _find_free(parent, indx)
+        if sched_at == n:
+            # If we are off the end
+            sched_at = last
+        elif (sched_at == indx) & (first_gap < indx):
+            sched_at = _find_free(parent, indx + 1)
+            if sched_at == n:
+                sched_at = indx
+        if sched_at < 0:
+            raise IndexError("No valid elements left to schedule")
+
+        sched[sched_at] += 1
+        free[sched_at] = False
+        parent[sched_at] = sched_at + 1
+        first_gap = min(first_gap, sched_at)
+        while (last >= 0) and not free[last]:
+            last -= 1
 
     return sched
 
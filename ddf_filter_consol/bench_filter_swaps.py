@@ -0,0 +1,104 @@
+"""Benchmark consolidate_filter_swaps on a DDF schedule.
+
+Generates the schedule for a config file without consolidation, then
+times `consolidate_filter_swaps` against a night-by-night loop and
+checks they give the same answer.
+
+python bench_filter_swaps.py --ddf_config_file ocean6.dat
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from rubin_scheduler.data import get_data_dir
+from rubin_scheduler.site_models import Almanac
+from rubin_scheduler.utils import SURVEY_START_MJD
+
+from ddf_presched import consolidate_filter_swaps, generate_ddf_scheduled_obs
+
+
+def consolidate_filter_swaps_loop(sched_obs, ddf_grid):
+    """Reference version of `consolidate_filter_swaps` that loops over
+    each night.
+    """
+    almanac = Almanac(mjd_start=ddf_grid["mjd"].min())
+    almanac_indx = almanac.mjd_indx(sched_obs["mjd"])
+    night = almanac.sunsets["night"][almanac_indx]
+
+    for n in np.unique(night):
+        indx = np.where(night == n)[0]
+        unique_names = np.unique(sched_obs["scheduler_note"][indx])
+        unique_names = unique_names[np.where(unique_names != "DD:EDFS_b")]
+
+        if np.size(unique_names) > 1:
+            ddf_names = [name.replace("DD:", "") for name in np.unique(sched_obs["scheduler_note"][indx])]
+
+            grid_indx = np.where(
+                (ddf_grid["mjd"] <= sched_obs["mjd"][indx].max())
+                & (ddf_grid["mjd"] >= sched_obs["mjd"][indx].min())
+            )[0]
+            for ddf_name in ddf_names:
+                good = np.where(np.isfinite(ddf_grid["%s_m5_g" % ddf_name][grid_indx]))[0]
+                grid_indx = grid_indx[good]
+
+            if np.size(grid_indx) > 0:
+                new_mjd = np.min(ddf_grid["mjd"][grid_indx])
+                flush_length = sched_obs["flush_by_mjd"][indx] - sched_obs["mjd"][indx]
+                sched_obs["mjd"][indx] = new_mjd
+                sched_obs["flush_by_mjd"][indx] = new_mjd + flush_length
+                new_order = np.lexsort((sched_obs["dec"][indx], sched_obs["band"][indx]))
+                sched_obs[indx] = sched_obs[indx[new_order]]
+
+    return sched_obs
+
+
+def load_ddf_grid(data_file=None, mjd_start=SURVEY_START_MJD, survey_length=10.0):
+    """The DDF grid over the survey, as `generate_ddf_scheduled_obs`
+    uses it
+    """
+    if data_file is None:
+        data_file = os.path.join(get_data_dir(), "scheduler", "ddf_grid.npz")
+    ddf_grid = np.load(data_file)["ddf_grid"]
+    mjd_max = mjd_start + survey_length * 365.25
+    in_range = np.where((ddf_grid["mjd"] >= mjd_start) & (ddf_grid["mjd"] <= mjd_max))
+    return ddf_grid[in_range]
+
+
+def bench_argparser():
+    parser = argparse.ArgumentParser(description="Benchmark consolidate_filter_swaps")
+    parser.add_argument("--ddf_config_file", type=str, default="ocean6.dat")
+    parser.add_argument("--data_file", type=str, default=None, help="DDF grid file")
+    parser.add_argument("--n_repeat", type=int, default=3)
+    parser.add_argument("--no_loop", dest="loop", action="store_false", help="Skip timing the loop version")
+    return parser
+
+
+if __name__ == "__main__":
+    args = bench_argparser().parse_args()
+
+    sched_obs = generate_ddf_scheduled_obs(
+        data_file=args.data_file, ddf_config_file=args.ddf_config_file, consolidate=False
+    )
+    ddf_grid = load_ddf_grid(data_file=args.data_file)
+    print("%i scheduled observations from %s" % (sched_obs.size, args.ddf_config_file))
+
+    funcs = {"vectorized": consolidate_filter_swaps}
+    if args.loop:
+        funcs["loop"] = consolidate_filter_swaps_loop
+
+    results = {}
+    for label, func in funcs.items():
+        times = []
+        for i in range(args.n_repeat):
+            obs = sched_obs.copy()
+            t0 = time.perf_counter()
+            results[label] = func(obs, ddf_grid)
+            times.append(time.perf_counter() - t0)
+        print("%s: best of %i %.3f s" % (label, args.n_repeat, np.min(times)))
+
+    moved = np.sum(results["vectorized"]["mjd"] != sched_obs["mjd"])
+    print("%i observations moved" % moved)
+    if args.loop:
+        print("matches loop: %s" % (results["vectorized"].tobytes() == results["loop"].tobytes()))
@@ -110,6 +110,18 @@ def ddf_slopes(
     return cumulative_desired
 
 
+def _find_free(parent, indx):
+    """Find the smallest free slot >= indx in a union-find "next free
+    slot" structure, compressing the path along the way.
+    """
+    root = indx
+    while parent[root] != root:
+        root = parent[root]
+    while parent[indx] != root:
+        parent[indx], indx = root, parent[indx]
+    return root
+
+
 def match_cumulative(cumulative_desired, mask=None, no_duplicate=True):
     """Generate a schedule that tries to match the desired cumulative
     distribution given a mask
@@ -136,33 +148,53 @@ def match_cumulative(cumulative_desired, mask=None, no_duplicate=True):
     if mask is None:
         mask = np.ones(sched.size)
 
-    valid = np.where(mask > 0)[0].tolist()
-    x = np.arange(sched.size)
+    valid = np.where(mask > 0)[0]
 
     drd = np.diff(rounded_desired)
     step_points = np.where(drd > 0)[0] + 1
 
-    # would be nice to eliminate this loop, but it's not too bad.
-    # can't just use searchsorted on the whole array, because then there
-    # can be duplicate values, and array[[n,n]] = 1 means that extra
-    # match gets lost.
-    for indx in step_points:
-        left = np.searchsorted(x[valid], indx)
-        right = np.searchsorted(x[valid], indx, side="right")
-        d1 = indx - left
-        d2 = right - indx
-        if d1 < d2:
-            sched_at = left
-        else:
-            sched_at = right
-
-        # If we are off the end
-        if sched_at >= len(valid):
-            sched_at -= 1
-
-        sched[valid[sched_at]] += 1
-        if no_duplicate:
-            valid.pop(sched_at)
+    # Each step point goes to the first valid element at or after it,
+    # or the one after that if the step lands on a valid element that
+    # has a gap somewhere before it. Off the end, take the last valid one.
+    if not no_duplicate:
+        left = np.searchsorted(valid, step_points)
+        right = np.searchsorted(valid, step_points, side="right")
+        sched_at = np.where(step_points - left < right - step_points, left, right)
+        sched_at[sched_at >= valid.size] -= 1
+        np.add.at(sched, valid[sched_at], 1)
+        return sched
+
+    # With no duplicates, valid elements get used up as we go. Track the
+    # free elements with a union-find "next free slot" structure so each
+    # step point is O(1) amortized rather than rebuilding the valid list.
+    n = sched.size
+    free = np.zeros(n, dtype=bool)
+    free[valid] = True
+    free = free.tolist()
+    parent = [i if free[i] else i + 1 for i in range(n)] + [n]
+    # Smallest element that is not free. Only ever decreases.
+    first_gap = free.index(False) if False in free else n
+    # Largest element that is still free. Only ever decreases.
+    last = int(valid[-1]) if valid.size > 0 else -1
+
+    for indx in step_points.tolist():
+        sched_at = _find_free(parent, indx)
+        if sched_at == n:
+            # If we are off the end
+            sched_at = last
+        elif (sched_at == indx) & (first_gap < indx):
+            sched_at = _find_free(parent, indx + 1)
+            if sched_at == n:
+                sched_at = indx
+        if sched_at < 0:
+            raise IndexError("No valid elements left to schedule")
+
+        sched[sched_at] += 1
+        free[sched_at] = False
+        parent[sched_at] = sched_at + 1
+        first_gap = min(first_gap, sched_at)
+        while (last >= 0) and not free[last]:
+            last -= 1
 
     return sched
 
@@ -413,38 +445,89 @@ def optimize_ddf_times(
 
 def consolidate_filter_swaps(sched_obs, ddf_grid):
     """Try to consolidate filter swaps within a night.
+
+    Nights with sequences on more than one DDF (EDFS_a and EDFS_b
+    count as one) are moved to the earliest time in the night when
+    all of the DDFs have finite g-band m5, then sorted by band and
+    declination so each band only needs to be loaded once. Nights
+    with no shared time are left alone.
+
+    Parameters
+    ----------
+    sched_obs : `ScheduledObservationArray`
+        The scheduled observations. Modified in place.
+    ddf_grid : `np.array`
+        The DDF grid covering the scheduled observations.
+
+    Returns
+    -------
+    sched_obs : `ScheduledObservationArray`
     """
+    if np.size(sched_obs) == 0:
+        return sched_obs
+
     almanac = Almanac(mjd_start=ddf_grid["mjd"].min())
     almanac_indx = almanac.mjd_indx(sched_obs["mjd"])
     night = almanac.sunsets["night"][almanac_indx]
 
-    for n in np.unique(night):
-        indx = np.where(night == n)[0]
-        unique_names = np.unique(sched_obs["scheduler_note"][indx])
-        unique_names = unique_names[np.where(unique_names != "DD:EDFS_b")]
-
-        if np.size(unique_names) > 1:
-            ddf_names = [name.replace("DD:", "") for name in np.unique(sched_obs["scheduler_note"][indx])]
-
-            flush_length = sched_obs[indx]["flush_by_mjd"] - sched_obs[indx]["mjd"]
-            # Sort by band then declination.
-            new_order = np.argsort(sched_obs[indx], order=["band", "dec"])
-            # Find the best time for all the DDFs in question.
-            grid_indx = np.where((ddf_grid["mjd"] <= sched_obs[indx]["mjd"].max()) &
-                                 (ddf_grid["mjd"] >= sched_obs[indx]["mjd"].min()))[0]
-
-            for ddf_name in ddf_names:
-                good = np.where(np.isfinite(ddf_grid["%s_m5_g" % ddf_name][grid_indx]))[0]
-                grid_indx = grid_indx[good]
-
-            # Only consolidate if we have a time that works
-            if np.size(grid_indx) > 0:
-                # Take the earlies time that works. Could be more 
-                # sophisticated and use the m5 depths.
-                new_mjd = np.min(ddf_grid["mjd"][grid_indx])
-                sched_obs[indx]["mjd"] = new_mjd
-                sched_obs[indx]["flush_by_mjd"] = sched_obs[indx]["mjd"] + flush_length
-                sched_obs[indx] = sched_obs[indx[new_order]]
+    # Group the observations by night
+    order = np.argsort(night, kind="stable")
+    starts = np.unique(night[order], return_index=True)[1]
+    n_per_night = np.diff(np.append(starts, order.size))
+
+    # Bitmask of which DDFs are in each night
+    notes, name_id = np.unique(sched_obs["scheduler_note"], return_inverse=True)
+    ddf_names = [note.replace("DD:", "") for note in notes]
+    night_bits = np.bitwise_or.reduceat(
+        np.left_shift(1, name_id[order].astype(np.int64)), starts
+    )
+    n_ddfs = np.zeros(starts.size, dtype=int)
+    for i, ddf_name in enumerate(ddf_names):
+        if ddf_name != "EDFS_b":
+            n_ddfs += (night_bits >> i) & 1
+    multi = np.where(n_ddfs > 1)[0]
+
+    # Range of the grid each night spans
+    mjds = sched_obs["mjd"][order]
+    grid_lo = np.searchsorted(ddf_grid["mjd"], np.minimum.reduceat(mjds, starts)[multi])
+    grid_hi = np.searchsorted(
+        ddf_grid["mjd"], np.maximum.reduceat(mjds, starts)[multi], side="right"
+    )
+
+    # Find the first time in each range where all the DDFs are up.
+    # Only a handful of DDF combinations, so loop over those.
+    n_grid = np.size(ddf_grid)
+    new_mjd = np.full(starts.size, np.nan)
+    for bits in np.unique(night_bits[multi]):
+        good = np.ones(n_grid, dtype=bool)
+        for i, ddf_name in enumerate(ddf_names):
+            if (bits >> i) & 1:
+                good &= np.isfinite(ddf_grid["%s_m5_g" % ddf_name])
+        # Index of the next good grid point at or after each point
+        next_good = np.append(np.where(good, np.arange(n_grid), n_grid), n_grid)
+        next_good = np.minimum.accumulate(next_good[::-1])[::-1]
+
+        these = np.where(night_bits[multi] == bits)[0]
+        first = next_good[grid_lo[these]]
+        # Only consolidate if we have a time that works. Take the
+        # earliest time that works. Could be more sophisticated and
+        # use the m5 depths.
+        works = np.where(first < grid_hi[these])[0]
+        new_mjd[multi[these[works]]] = ddf_grid["mjd"][first[works]]
+
+    obs_mjd = np.repeat(new_mjd, n_per_night)
+    move = np.where(np.isfinite(obs_mjd))[0]
+    indx = order[move]
+    flush_length = sched_obs["flush_by_mjd"][indx] - sched_obs["mjd"][indx]
+    sched_obs["mjd"][indx] = obs_mjd[move]
+    sched_obs["flush_by_mjd"][indx] = obs_mjd[move] + flush_length
+
+    # Sort by band then declination within each night.
+    night_id = np.repeat(np.arange(starts.size), n_per_night)[move]
+    new_order = np.lexsort(
+        (sched_obs["dec"][indx], sched_obs["band"][indx], night_id)
+    )
+    sched_obs[indx] = sched_obs[indx[new_order]]
 
     return sched_obs
 
@@ -469,6 +552,7 @@ def generate_ddf_scheduled_obs(
     ddf_config_file="ocean1.dat",
     overhead=2.0,
     illum_limit=40.,
+    consolidate=True,
 ):
     """
 
@@ -532,6 +616,8 @@ def generate_ddf_scheduled_obs(
     illum_limit : `float`
         The moon illumination limit for when u and y are loaded.
         Default 40 (percent).
+    consolidate : `bool`
+        Run `consolidate_filter_swaps` on the result. Default True.
     """
     if data_file is None:
         data_file = os.path.join(get_data_dir(), "scheduler", "ddf_grid.npz")
@@ -699,6 +785,7 @@ def generate_ddf_scheduled_obs(
     result = np.concatenate(all_scheduled_obs)
 
     # Try to consolidate things that are on the same night
-    result = consolidate_filter_swaps(result, ddf_grid)
+    if consolidate:
+        result = consolidate_filter_swaps(result, ddf_grid)
 
     return result
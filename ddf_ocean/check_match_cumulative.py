@@ -0,0 +1,156 @@
+"""Check match_cumulative against the loop it replaced.
+
+Generates the DDF schedule for each shipped ocean*.dat config with the
+current `match_cumulative` and with the original loop, and checks the
+schedules are identical. Also compares the two directly on random
+masks and cumulative curves.
+
+python check_match_cumulative.py
+python check_match_cumulative.py --ddf_config_files ocean6.dat ocean7.dat
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import ddf_presched
+from ddf_presched import generate_ddf_scheduled_obs, match_cumulative
+
+
+def match_cumulative_loop(cumulative_desired, mask=None, no_duplicate=True):
+    """Reference version of `match_cumulative`, the original loop."""
+    rounded_desired = np.round(cumulative_desired)
+    sched = cumulative_desired * 0
+    if mask is None:
+        mask = np.ones(sched.size)
+
+    valid = np.where(mask > 0)[0].tolist()
+    x = np.arange(sched.size)
+
+    drd = np.diff(rounded_desired)
+    step_points = np.where(drd > 0)[0] + 1
+
+    for indx in step_points:
+        left = np.searchsorted(x[valid], indx)
+        right = np.searchsorted(x[valid], indx, side="right")
+        d1 = indx - left
+        d2 = right - indx
+        if d1 < d2:
+            sched_at = left
+        else:
+            sched_at = right
+
+        # If we are off the end
+        if sched_at >= len(valid):
+            sched_at -= 1
+
+        sched[valid[sched_at]] += 1
+        if no_duplicate:
+            valid.pop(sched_at)
+
+    return sched
+
+
+def _outcome(func, *args, **kwargs):
+    """Result of func, or the type of exception it raised"""
+    try:
+        return func(*args, **kwargs)
+    except IndexError as error:
+        return type(error)
+
+
+def check_random(n_trials=2000, seed=42):
+    """Compare on random masks and cumulative curves
+
+    Returns
+    -------
+    n_bad : `int`
+        Number of trials where the two differ.
+    """
+    rng = np.random.default_rng(seed)
+    n_bad = 0
+    for i in range(n_trials):
+        n = rng.integers(2, 400)
+        cumulative_desired = np.cumsum(rng.random(n) * rng.random() * 1.5)
+        mask = (rng.random(n) > rng.random()).astype(int)
+        for no_duplicate in [True, False]:
+            new = _outcome(match_cumulative, cumulative_desired, mask, no_duplicate)
+            old = _outcome(
+                match_cumulative_loop, cumulative_desired, mask, no_duplicate
+            )
+            if isinstance(new, np.ndarray) and isinstance(old, np.ndarray):
+                same = np.array_equal(new, old)
+            else:
+                same = new is old
+            if not same:
+                n_bad += 1
+    return n_bad
+
+
+def check_config(ddf_config_file, data_file=None):
+    """Compare the schedules from one config file
+
+    Returns
+    -------
+    same : `bool` or None
+        Whether the schedules are identical. None if the config can
+        not be run by this version of ddf_presched.
+    """
+    configs = pd.read_csv(ddf_config_file, sep=",", comment="#")
+    try:
+        t0 = time.perf_counter()
+        new = generate_ddf_scheduled_obs(data_file=data_file, ddf_config_file=configs)
+        t1 = time.perf_counter()
+    except KeyError as error:
+        print("%s: can not be run, missing column %s" % (ddf_config_file, error))
+        return None
+
+    # optimize_ddf_times looks match_cumulative up in the module
+    ddf_presched.match_cumulative = match_cumulative_loop
+    try:
+        old = generate_ddf_scheduled_obs(data_file=data_file, ddf_config_file=configs)
+    finally:
+        ddf_presched.match_cumulative = match_cumulative
+    t2 = time.perf_counter()
+
+    same = new.tobytes() == old.tobytes()
+    print(
+        "%s: %i observations, %.2f s (loop %.2f s), identical: %s"
+        % (ddf_config_file, new.size, t1 - t0, t2 - t1, same)
+    )
+    return same
+
+
+def check_argparser():
+    parser = argparse.ArgumentParser(
+        description="Check match_cumulative against the original loop"
+    )
+    parser.add_argument(
+        "--ddf_config_files",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Config files to check. Default every ocean*.dat here",
+    )
+    parser.add_argument("--data_file", type=str, default=None, help="DDF grid file")
+    parser.add_argument("--n_trials", type=int, default=2000)
+    return parser
+
+
+if __name__ == "__main__":
+    args = check_argparser().parse_args()
+    config_files = args.ddf_config_files
+    if config_files is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        config_files = sorted(glob.glob(os.path.join(here, "ocean*.dat")))
+
+    n_bad = check_random(n_trials=args.n_trials)
+    print("random masks: %i of %i trials differ" % (n_bad, args.n_trials))
+    assert n_bad == 0
+
+    for config_file in config_files:
+        assert check_config(config_file, data_file=args.data_file) is not False
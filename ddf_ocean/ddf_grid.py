@@ -0,0 +1,335 @@
+"""Build (or extend) the DDF grid used to preschedule DDF sequences.
+
+The grid has the sun altitude, moon phase and altitude, and the airmass,
+g band sky brightness and g band five sigma depth of each DDF at regular
+times. It is what `rubin_scheduler.scheduler.surveys.generate_ddf_grid`
+makes, but computed in parallel, and only for times an existing grid
+does not already cover, so a new survey start date does not mean
+recomputing 40 years of sky brightness.
+
+python ddf_grid.py --mjd_start 60886 --survey_length 10.5 --n_workers 32
+python ddf_grid.py --base_file ddf_grid.npy --mjd_start 60700 --survey_length 11
+"""
+
+__all__ = (
+    "ddf_grid_dtype",
+    "compute_ddf_grid",
+    "extend_ddf_grid",
+    "write_ddf_grid",
+)
+
+import argparse
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from rubin_scheduler.site_models import Almanac, SeeingModel
+from rubin_scheduler.utils import SURVEY_START_MJD, ddf_locations, m5_flat_sed
+
+# Built once per process, see _sky_model, _almanac and _seeing_model
+_SKY_MODEL = None
+_ALMANAC = None
+_SEEING_MODEL = None
+
+
+def ddf_grid_dtype(ddf_names=None):
+    """The columns of a DDF grid
+
+    Parameters
+    ----------
+    ddf_names : `list` of `str`, optional
+        The DDFs to include. Default None uses all of `ddf_locations`.
+    """
+    if ddf_names is None:
+        ddf_names = list(ddf_locations().keys())
+    names = ["mjd", "sun_alt", "sun_n18_rising_next", "moon_phase", "moon_alt"]
+    for ddf_name in ddf_names:
+        names += [ddf_name + "_airmass", ddf_name + "_sky_g", ddf_name + "_m5_g"]
+    return [(name, float) for name in names]
+
+
+def _sky_model():
+    """The sky brightness model, loaded once per process"""
+    global _SKY_MODEL
+    if _SKY_MODEL is None:
+        # Slow and memory hungry to import, so only done when needed.
+        import rubin_sim.skybrightness as sb
+
+        _SKY_MODEL = sb.SkyModel(mags=True)
+    return _SKY_MODEL
+
+
+def _almanac():
+    """The almanac, loaded once per process"""
+    global _ALMANAC
+    if _ALMANAC is None:
+        _ALMANAC = Almanac()
+    return _ALMANAC
+
+
+def _seeing_model():
+    """The seeing model, built once per process"""
+    global _SEEING_MODEL
+    if _SEEING_MODEL is None:
+        _SEEING_MODEL = SeeingModel()
+    return _SEEING_MODEL
+
+
+def _compute_chunk(mjds, sun_limit=-12.0, nominal_expt=30.0, nominal_seeing=0.7):
+    """The DDF grid at the given times, see `compute_ddf_grid`"""
+    dds = ddf_locations()
+    ddf_names = list(dds.keys())
+    ras = np.radians([dds[name][0] for name in ddf_names])
+    decs = np.radians([dds[name][1] for name in ddf_names])
+    sun_limit = np.radians(sun_limit)
+
+    result = np.zeros(mjds.size, dtype=ddf_grid_dtype(ddf_names))
+    result["mjd"] = mjds
+    mags = np.zeros((mjds.size, len(ddf_names)))
+    airmasses = np.zeros((mjds.size, len(ddf_names)))
+
+    sm = _sky_model()
+    for i, mjd in enumerate(mjds):
+        try:
+            sm.set_ra_dec_mjd(ras, decs, mjd, degrees=False)
+        except ValueError:
+            # Outside the range of the sky model
+            sm.sun_alt = 12.0
+        mags[i] = sm.return_mags()["g"]
+        airmasses[i] = sm.airmass
+        # Zeroed in daytime the way rubin_scheduler's
+        # generate_ddf_grid does it, so NaNs (e.g., below the
+        # horizon) stay NaN
+        if sm.sun_alt > sun_limit:
+            mags[i] *= 0
+            airmasses[i] *= 0
+        result["sun_alt"][i] = sm.sun_alt
+        result["moon_alt"][i] = sm.moon_alt
+        result["moon_phase"][i] = sm.moon_phase
+
+    # Next astronomical twilight in the morning. NaN outside the range
+    # of the almanac, where the next one is not known.
+    sunsets = _almanac().sunsets
+    indx = np.searchsorted(sunsets["sun_n18_rising"], mjds, side="right")
+    known = (mjds >= sunsets["sunset"][0]) & (indx < sunsets.size)
+    result["sun_n18_rising_next"] = np.nan
+    result["sun_n18_rising_next"][known] = sunsets["sun_n18_rising"][indx[known]]
+
+    # g band depth for a nominal zenith seeing
+    seeing_model = _seeing_model()
+    seeing_indx = 1  # 0=u, 1=g, 2=r, etc.
+    for i, name in enumerate(ddf_names):
+        result[name + "_airmass"] = airmasses[:, i]
+        result[name + "_sky_g"] = mags[:, i]
+        fwhm_eff = seeing_model(nominal_seeing, airmasses[:, i])["fwhmEff"][
+            seeing_indx, :
+        ]
+        result[name + "_m5_g"] = m5_flat_sed(
+            "g", mags[:, i], fwhm_eff, nominal_expt, airmasses[:, i], nexp=1
+        )
+
+    return result
+
+
+def compute_ddf_grid(
+    mjds,
+    sun_limit=-12.0,
+    nominal_expt=30.0,
+    nominal_seeing=0.7,
+    n_workers=None,
+    chunk_size=2000,
+):
+    """Compute the DDF grid at the given times
+
+    Parameters
+    ----------
+    mjds : `np.array`
+        The times to compute.
+    sun_limit : `float`
+        Sky brightness and airmass are only computed when the sun is
+        below this altitude (degrees). Default -12.
+    nominal_expt : `float`
+        Exposure time for the g band depth (seconds). Default 30.
+    nominal_seeing : `float`
+        Zenith FWHM_500 seeing for the g band depth (arcsec).
+        Default 0.7.
+    n_workers : `int`, optional
+        Number of processes to spread the chunks of time over.
+        Default None computes them serially.
+    chunk_size : `int`
+        Number of times per chunk. Default 2000.
+
+    Returns
+    -------
+    ddf_grid : `np.array`
+        One row per mjd, with the columns from `ddf_grid_dtype`.
+        sun_n18_rising_next is NaN for times outside the almanac.
+    """
+    mjds = np.asarray(mjds, dtype=float)
+    if mjds.size == 0:
+        return np.zeros(0, dtype=ddf_grid_dtype())
+    chunks = np.array_split(mjds, int(np.ceil(mjds.size / chunk_size)))
+    chunk_func = partial(
+        _compute_chunk,
+        sun_limit=sun_limit,
+        nominal_expt=nominal_expt,
+        nominal_seeing=nominal_seeing,
+    )
+    if (n_workers is not None) and (n_workers > 1):
+        # map keeps the chunks in time order
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(chunk_func, chunks))
+    else:
+        results = [chunk_func(chunk) for chunk in chunks]
+    result = np.concatenate(results)
+    if np.isnan(result["sun_n18_rising_next"]).any():
+        warnings.warn(
+            "Some times are outside the almanac, their sun_n18_rising_next is NaN"
+        )
+    return result
+
+
+def extend_ddf_grid(
+    ddf_grid=None,
+    mjd_start=SURVEY_START_MJD,
+    survey_length=10.5,
+    delta_t=15.0,
+    **kwargs,
+):
+    """Make a DDF grid that covers a survey, reusing an existing grid
+
+    Only times the existing grid does not cover are computed, on the
+    same time spacing, and added to either end.
+
+    Parameters
+    ----------
+    ddf_grid : `np.array`, optional
+        An existing DDF grid, with evenly spaced times. Default None
+        computes the whole range.
+    mjd_start : `float`
+        Start of the range to cover. Default SURVEY_START_MJD.
+    survey_length : `float`
+        Length of the range to cover (years). Default 10.5.
+    delta_t : `float`
+        Time spacing of a new grid (minutes). An existing grid keeps its
+        own spacing. Default 15.
+    **kwargs
+        Passed to `compute_ddf_grid`.
+
+    Returns
+    -------
+    ddf_grid : `np.array`
+        The grid, covering at least mjd_start to
+        mjd_start + survey_length.
+    """
+    mjd_end = mjd_start + survey_length * 365.25
+    if (ddf_grid is None) or (ddf_grid.size < 2):
+        delta_t = delta_t / 60.0 / 24.0
+        n_steps = int(np.ceil((mjd_end - mjd_start) / delta_t)) + 1
+        return compute_ddf_grid(mjd_start + delta_t * np.arange(n_steps), **kwargs)
+
+    if ddf_grid.dtype != np.dtype(ddf_grid_dtype()):
+        raise ValueError(
+            "Existing DDF grid has different columns than ddf_locations, "
+            "it has to be regenerated without it"
+        )
+    mjd0 = ddf_grid["mjd"][0]
+    delta_t = (ddf_grid["mjd"][-1] - mjd0) / (ddf_grid.size - 1)
+    # Whole steps before and after the existing grid, so the new times
+    # line up with the old ones. Allow for round off in the spacing.
+    n_before = max(int(np.ceil((mjd0 - mjd_start) / delta_t - 1e-6)), 0)
+    n_after = max(int(np.ceil((mjd_end - ddf_grid["mjd"][-1]) / delta_t - 1e-6)), 0)
+    if (n_before == 0) and (n_after == 0):
+        return ddf_grid
+
+    before = mjd0 + delta_t * np.arange(-n_before, 0)
+    after = mjd0 + delta_t * np.arange(ddf_grid.size, ddf_grid.size + n_after)
+    new_points = compute_ddf_grid(np.concatenate([before, after]), **kwargs)
+    return np.concatenate(
+        [new_points[:n_before], np.asarray(ddf_grid), new_points[n_before:]]
+    )
+
+
+def write_ddf_grid(ddf_grid, filename):
+    """Save a DDF grid
+
+    Parameters
+    ----------
+    ddf_grid : `np.array`
+        The grid.
+    filename : `str`
+        Where to save it. A .npy file can be memory-mapped by
+        `ddf_presched`, a .npz file is saved the way rubin_sim_data has
+        it (and gets a .npy copy in the user's cache directory the first
+        time it is loaded).
+    """
+    # Write to a temp file and move it, so runs using the grid never
+    # see a partially written file.
+    temp_file = filename + ".%i.tmp" % os.getpid()
+    with open(temp_file, "wb") as outfile:
+        if filename.endswith(".npz"):
+            np.savez(outfile, ddf_grid=ddf_grid)
+        else:
+            np.save(outfile, ddf_grid)
+    os.replace(temp_file, filename)
+
+
+def _read_ddf_grid(filename):
+    """Load a saved DDF grid, memory-mapped if it is a .npy file"""
+    if filename.endswith(".npz"):
+        return np.load(filename)["ddf_grid"]
+    return np.load(filename, mmap_mode="r")
+
+
+def grid_argparser():
+    parser = argparse.ArgumentParser(
+        description="Build or extend the DDF grid for a survey start date"
+    )
+    parser.add_argument(
+        "--mjd_start", type=float, default=SURVEY_START_MJD, help="Survey start MJD"
+    )
+    parser.add_argument(
+        "--survey_length",
+        type=float,
+        default=10.5,
+        help="Years to cover from mjd_start",
+    )
+    parser.add_argument(
+        "--delta_t", type=float, default=15.0, help="Time spacing of a new grid (min)"
+    )
+    parser.add_argument(
+        "--base_file",
+        type=str,
+        default=None,
+        help="Existing grid (.npz or .npy) to extend instead of starting over",
+    )
+    parser.add_argument(
+        "--out_file", type=str, default="ddf_grid.npy", help="Where to save the grid"
+    )
+    parser.add_argument(
+        "--n_workers", type=int, default=None, help="Number of processes to use"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = grid_argparser().parse_args()
+    base = None
+    if args.base_file is not None:
+        base = _read_ddf_grid(args.base_file)
+    ddf_grid = extend_ddf_grid(
+        base,
+        mjd_start=args.mjd_start,
+        survey_length=args.survey_length,
+        delta_t=args.delta_t,
+        n_workers=args.n_workers,
+    )
+    if (base is not None) and (ddf_grid.size == base.size):
+        warnings.warn("%s already covers the requested range" % args.base_file)
+    write_ddf_grid(ddf_grid, args.out_file)
+    print(
+        "Wrote %s: %i times from MJD %.2f to %.2f"
+        % (args.out_file, ddf_grid.size, ddf_grid["mjd"][0], ddf_grid["mjd"][-1])
+    )
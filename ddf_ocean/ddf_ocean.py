@@ -1292,6 +1292,11 @@ def ddf_surveys(
     nsnaps={"u": 1, "g": 2, "r": 2, "i": 2, "z": 2, "y": 2},
     ddf_config_file="ocean1.dat",
     mjd_start=SURVEY_START_MJD,
+    n_workers=None,
+    cache_dir=None,
+    refresh_cache=False,
+    resolve_conflicts=False,
+    refine_times=False,
 ):
     """Generate surveys for DDF observations
 
@@ -1307,6 +1312,19 @@ def ddf_surveys(
         Default None.
     expt : `float`
         Exposure time for DDF visits. Default 29.2.
+    n_workers : `int`
+        Number of processes to use when generating the DDF
+        schedule. Default None runs serially.
+    cache_dir : `str`
+        Directory to cache the DDF schedule in. Default None
+        regenerates it every time.
+    refresh_cache : `bool`
+        Regenerate and re-cache the DDF schedule. Default False.
+    resolve_conflicts : `bool`
+        Move DDF sequences so different fields are not scheduled at
+        the same time. Default False.
+    refine_times : `bool`
+        Place DDF sequences between the DDF grid points. Default False.
     """
 
     obs_array = generate_ddf_scheduled_obs(
@@ -1314,6 +1332,11 @@ def ddf_surveys(
         nsnaps=nsnaps,
         ddf_config_file=ddf_config_file,
         mjd_start=mjd_start,
+        n_workers=n_workers,
+        cache_dir=cache_dir,
+        refresh_cache=refresh_cache,
+        resolve_conflicts=resolve_conflicts,
+        refine_times=refine_times,
     )
 
     survey1 = ScriptedSurvey(
@@ -1636,6 +1659,10 @@ def gen_scheduler(args):
     too = not args.no_too
 
     ddf_config_file = args.ddf_config_file
+    ddf_n_workers = args.ddf_n_workers
+    ddf_cache_dir = args.ddf_cache_dir
+    if args.no_ddf_cache:
+        ddf_cache_dir = None
 
     # Parameters that were previously command-line
     # arguments.
@@ -1659,9 +1686,15 @@ def gen_scheduler(args):
     # if changing mjd_start
     mjd_start = SURVEY_START_MJD + mjd_plus
 
+    file_end = ddf_config_file.replace(".dat", "") + "updated_"
+    if args.ddf_resolve_conflicts:
+        # Keep runs with DDF placement options apart from ones without
+        file_end += "resolved_"
+    if args.ddf_refine_times:
+        file_end += "refined_"
     fileroot, extra_info = set_run_info(
         dbroot=dbroot,
-        file_end=ddf_config_file.replace(".dat", "") + "updated_v4.3.5_",
+        file_end=file_end + "v4.3.5_",
         out_dir=out_dir,
     )
 
@@ -1746,6 +1779,11 @@ def gen_scheduler(args):
         nside=nside,
         ddf_config_file=ddf_config_file,
         mjd_start=mjd_start,
+        n_workers=ddf_n_workers,
+        cache_dir=ddf_cache_dir,
+        refresh_cache=args.refresh_ddf_cache,
+        resolve_conflicts=args.ddf_resolve_conflicts,
+        refine_times=args.ddf_refine_times,
     )
 
     greedy = gen_greedy_surveys(nside, nexp=nexp, footprints=footprints)
@@ -1883,6 +1921,48 @@ def sched_argparser():
     parser.set_defaults(no_too=False)
 
     parser.add_argument("--ddf_config_file", type=str, default="ocean6.dat")
+    parser.add_argument(
+        "--ddf_n_workers",
+        type=int,
+        default=None,
+        help="Number of processes to use generating the DDF schedule",
+    )
+    parser.add_argument(
+        "--ddf_cache_dir",
+        type=str,
+        default=None,
+        help="Directory to cache generated DDF schedules in. Default None, no cache",
+    )
+    parser.add_argument(
+        "--no_ddf_cache",
+        dest="no_ddf_cache",
+        action="store_true",
+        help="Always regenerate the DDF schedule, ignoring --ddf_cache_dir",
+    )
+    parser.set_defaults(no_ddf_cache=False)
+    parser.add_argument(
+        "--refresh_ddf_cache",
+        dest="refresh_ddf_cache",
+        action="store_true",
+        help="Regenerate the DDF schedule and overwrite the cached one",
+    )
+    parser.set_defaults(refresh_ddf_cache=False)
+    parser.add_argument(
+        "--ddf_resolve_conflicts",
+        dest="ddf_resolve_conflicts",
+        action="store_true",
+        help="Move DDF sequences so different fields are not scheduled at the same "
+        "time. Adds resolved to the output name",
+    )
+    parser.set_defaults(ddf_resolve_conflicts=False)
+    parser.add_argument(
+        "--ddf_refine_times",
+        dest="ddf_refine_times",
+        action="store_true",
+        help="Place DDF sequences between the 15 minute DDF grid points. "
+        "Adds refined to the output name",
+    )
+    parser.set_defaults(ddf_refine_times=False)
 
     return parser
 
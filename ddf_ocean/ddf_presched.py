@@ -1,21 +1,380 @@
 __all__ = (
+    "DDFGridCache",
+    "DDF_GRID_CACHE",
+    "GridMask",
+    "ddf_schedule_hash",
+    "config_row_sequences",
     "generate_ddf_scheduled_obs",
     "ddf_slopes",
     "match_cumulative",
+    "nearest_grid_index",
     "optimize_ddf_times",
+    "resolve_ddf_conflicts",
 )
 
+import hashlib
 import os
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 import numpy as np
 import pandas as pd
+import rubin_scheduler
 from rubin_scheduler.data import get_data_dir
 from rubin_scheduler.scheduler.utils import ScheduledObservationArray
 from rubin_scheduler.site_models import Almanac
 from rubin_scheduler.utils import SURVEY_START_MJD, calc_season, ddf_locations
 
 
+def _default_ddf_grid_file():
+    """The DDF grid file that ships in rubin_sim_data."""
+    return os.path.join(get_data_dir(), "scheduler", "ddf_grid.npz")
+
+
+def _npy_cache_file(data_file):
+    """Where the .npy copy of an .npz DDF grid is kept
+
+    In the user's cache directory ($XDG_CACHE_HOME, or ~/.cache), rather
+    than beside the .npz, which is usually in a shared rubin_sim_data.
+    The name includes a hash of the .npz path, so grids with the same
+    file name don't collide.
+    """
+    cache_dir = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    path_hash = hashlib.sha1(os.path.abspath(data_file).encode()).hexdigest()[:12]
+    name = "%s_%s.npy" % (os.path.splitext(os.path.basename(data_file))[0], path_hash)
+    return os.path.join(cache_dir, "ddf_presched", name)
+
+
+def _load_ddf_grid(data_file):
+    """Load the DDF grid as a read-only memory map
+
+    An uncompressed .npy copy of an .npz file is written to the user's
+    cache directory the first time (see `_npy_cache_file`), so later
+    loads (and other processes on the same node) can memory-map it and
+    share the pages.
+    """
+    if data_file.endswith(".npy"):
+        return np.load(data_file, mmap_mode="r")
+
+    npy_file = _npy_cache_file(data_file)
+    stale = (not os.path.isfile(npy_file)) or (
+        os.path.getmtime(npy_file) < os.path.getmtime(data_file)
+    )
+    if stale:
+        ddf_grid = np.load(data_file)["ddf_grid"]
+        # Write to a temp file and move it, so parallel runs never
+        # see a partially written file.
+        temp_file = npy_file + ".%i.tmp" % os.getpid()
+        try:
+            os.makedirs(os.path.dirname(npy_file), exist_ok=True)
+            with open(temp_file, "wb") as outfile:
+                np.save(outfile, ddf_grid)
+            os.replace(temp_file, npy_file)
+        except OSError:
+            warnings.warn("Could not write %s, not memory-mapping DDF grid" % npy_file)
+            return ddf_grid
+
+    return np.load(npy_file, mmap_mode="r")
+
+
+# Number of set bits in each possible byte
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+class GridMask:
+    """A set of DDF grid points, packed one bit per point
+
+    Constraints on the grid (sun, airmass, moon, even/odd nights, ...)
+    are each a GridMask, and combine with ``&``, ``|`` and ``~``
+    without unpacking. Operations always return a new mask. A ten year
+    grid takes ~45 kB rather than the ~350 kB of a bool array or
+    ~2.8 MB of an int array.
+
+    Parameters
+    ----------
+    bits : `np.array`, uint8
+        The points, packed by `np.packbits`. Padding bits past size
+        must be zero.
+    size : `int`
+        The number of grid points.
+    """
+
+    def __init__(self, bits, size):
+        self.bits = bits
+        self.size = size
+
+    @classmethod
+    def from_bool(cls, mask):
+        """Pack a boolean array"""
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask), mask.size)
+
+    def to_bool(self):
+        """Unpack to a boolean array"""
+        return np.unpackbits(self.bits, count=self.size).view(bool)
+
+    def _check(self, other):
+        if self.size != other.size:
+            raise ValueError(
+                "GridMask sizes do not match (%i, %i)" % (self.size, other.size)
+            )
+
+    def __and__(self, other):
+        self._check(other)
+        return GridMask(self.bits & other.bits, self.size)
+
+    def __or__(self, other):
+        self._check(other)
+        return GridMask(self.bits | other.bits, self.size)
+
+    def _clear_padding(self):
+        n_pad = self.bits.size * 8 - self.size
+        if n_pad > 0:
+            self.bits[-1] &= (0xFF << n_pad) & 0xFF
+        return self
+
+    def __invert__(self):
+        return GridMask(~self.bits, self.size)._clear_padding()
+
+    def shift(self, n):
+        """Move the set points n grid points earlier
+
+        Point i of the result is point i + n of this mask, and points
+        shifted in past the end are not set. Negative n moves points
+        later.
+        """
+        n_bytes, n_bits = divmod(abs(n), 8)
+        n_total = self.bits.size
+        # One spare zero byte on each side to carry bits in from
+        bits = np.zeros(n_total + 2, dtype=np.uint8)
+        if n_bytes < n_total:
+            if n >= 0:
+                bits[1 : n_total - n_bytes + 1] = self.bits[n_bytes:]
+            else:
+                bits[n_bytes + 1 : n_total + 1] = self.bits[: n_total - n_bytes]
+        if n_bits > 0:
+            if n >= 0:
+                bits[1:-1] = (bits[1:-1] << n_bits) | (bits[2:] >> (8 - n_bits))
+            else:
+                bits[1:-1] = (bits[1:-1] >> n_bits) | (bits[:-2] << (8 - n_bits))
+        return GridMask(bits[1:-1], self.size)._clear_padding()
+
+    def count(self):
+        """Number of set points"""
+        return int(_POPCOUNT[self.bits].sum())
+
+    def segment_counts(self, starts):
+        """Number of set points in each segment of the grid
+
+        Parameters
+        ----------
+        starts : `np.array`, int
+            Sorted index of the first point of each segment, e.g., the
+            first grid point of each night. Each segment runs to the
+            next start, the last to the end of the grid.
+
+        Returns
+        -------
+        counts : `np.array`, int
+            Set points in each segment.
+        """
+        # Set points before each bit position, from the whole bytes
+        # before it plus the leading bits of its own byte
+        cumulative = np.concatenate(([0], np.cumsum(_POPCOUNT[self.bits])))
+        edges = np.append(starts, self.size)
+        byte_indx, bit_indx = np.divmod(edges, 8)
+        bits = np.append(self.bits, np.uint8(0))
+        leading = bits[byte_indx] & (0xFF << (8 - bit_indx)).astype(np.uint8)
+        before = cumulative[byte_indx] + _POPCOUNT[leading]
+        return np.diff(before)
+
+
+class DDFGridCache:
+    """Load pre-computed DDF grids once and memoize arrays derived from them
+
+    Generating DDF schedules needs the DDF grid, an Almanac, the
+    night (and season) of each grid point, and the grid points each DDF
+    can be observed at. These only depend on the grid file, the survey
+    dates and the field limits, so keep them around rather than
+    rebuilding them for every call to `generate_ddf_scheduled_obs`,
+    `optimize_ddf_times` or `consolidate_filter_swaps`.
+    Use the module-level ``DDF_GRID_CACHE`` instance.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Drop everything that has been cached."""
+        self.grids = {}
+        self.almanacs = {}
+        self.nights = {}
+        self.night_indices = {}
+        self.seasons = {}
+        self.masks = {}
+
+    def load(self, data_file=None):
+        """Return the full DDF grid, memory-mapped if possible.
+
+        Parameters
+        ----------
+        data_file : `path` (None)
+            The data file to use for DDF airmass, m5, etc. Defaults to
+            using whatever is in rubin_sim_data/scheduler directory.
+        """
+        if data_file is None:
+            data_file = _default_ddf_grid_file()
+        if data_file not in self.grids:
+            self.grids[data_file] = _load_ddf_grid(data_file)
+        return self.grids[data_file]
+
+    def almanac(self, mjd_start):
+        """Return an Almanac with nights counted from mjd_start."""
+        if mjd_start not in self.almanacs:
+            self.almanacs[mjd_start] = Almanac(mjd_start=mjd_start)
+        return self.almanacs[mjd_start]
+
+    def get(self, data_file=None, mjd_start=SURVEY_START_MJD, survey_length=10.0):
+        """Return the DDF grid trimmed to the survey and the night of
+        each grid point.
+
+        Parameters
+        ----------
+        data_file : `path` (None)
+            The DDF grid file.
+        mjd_start : `float`
+            Starting MJD of the survey.
+        survey_length : `float`
+            Length of survey (years).
+
+        Returns
+        -------
+        ddf_grid : `np.array`
+            The DDF grid between mjd_start and the end of the survey.
+        night : `np.array`
+            The night of each grid point.
+        """
+        key = (data_file, mjd_start, survey_length)
+        if key not in self.nights:
+            ddf_grid = self.load(data_file)
+            mjd_max = mjd_start + survey_length * 365.25
+
+            # check if our pre-computed grid is over the time range we think
+            # we are scheduling for
+            if (ddf_grid["mjd"].min() > mjd_start) | (ddf_grid["mjd"].max() < mjd_max):
+                warnings.warn(
+                    "Pre-computed DDF properties don't match requested survey times. "
+                    "Extend the grid with ddf_grid.py and pass it as data_file."
+                )
+
+            # The grid is in time order, so slicing keeps a view
+            # of the memory map rather than making a copy.
+            start = np.searchsorted(ddf_grid["mjd"], mjd_start)
+            end = np.searchsorted(ddf_grid["mjd"], mjd_max, side="right")
+            ddf_grid = ddf_grid[start:end]
+
+            almanac = self.almanac(ddf_grid["mjd"].min())
+            night = almanac.sunsets["night"][almanac.mjd_indx(ddf_grid["mjd"])]
+            self.nights[key] = (ddf_grid, night)
+
+        return self.nights[key]
+
+    def night_index(
+        self, data_file=None, mjd_start=SURVEY_START_MJD, survey_length=10.0
+    ):
+        """Return the unique nights of the grid, and the index of the
+        first grid point in each. Parameters are passed to `get`.
+        """
+        key = (data_file, mjd_start, survey_length)
+        if key not in self.night_indices:
+            night = self.get(
+                data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+            )[1]
+            self.night_indices[key] = np.unique(night, return_index=True)
+        return self.night_indices[key]
+
+    def field_mask(
+        self,
+        ddf_name,
+        sun_limit=-18,
+        sequence_time=60.0,
+        airmass_limit=2.5,
+        sky_limit=None,
+        g_depth_limit=23.5,
+        data_file=None,
+        mjd_start=SURVEY_START_MJD,
+        survey_length=10.0,
+    ):
+        """Return the grid points where a DDF passes the sun, airmass,
+        sky and depth limits, as a `GridMask`.
+
+        These don't change between seasons or sequences, so each DDF
+        only needs a few. See `optimize_ddf_times` for the limits,
+        the other parameters are passed to `get`.
+        """
+        key = (
+            ddf_name,
+            sun_limit,
+            sequence_time,
+            airmass_limit,
+            sky_limit,
+            g_depth_limit,
+            data_file,
+            mjd_start,
+            survey_length,
+        )
+        if key not in self.masks:
+            ddf_grid = self.get(
+                data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+            )[0]
+            self.masks[key] = _field_mask(
+                ddf_name,
+                ddf_grid,
+                sun_limit=sun_limit,
+                sequence_time=sequence_time,
+                airmass_limit=airmass_limit,
+                sky_limit=sky_limit,
+                g_depth_limit=g_depth_limit,
+            )
+        return self.masks[key]
+
+    def night_season(
+        self,
+        ddf_RA,
+        season_mjd_start=SURVEY_START_MJD,
+        data_file=None,
+        mjd_start=SURVEY_START_MJD,
+        survey_length=10.0,
+    ):
+        """Return the season of each unique night of the grid, shifted
+        to start at season 0, as used by `optimize_ddf_times`.
+
+        Parameters
+        ----------
+        ddf_RA : `float`
+            The RA of the DDF (degrees).
+        season_mjd_start : `float`
+            The MJD to count seasons from.
+        data_file, mjd_start, survey_length
+            Passed to `get`.
+        """
+        key = (ddf_RA, season_mjd_start, data_file, mjd_start, survey_length)
+        if key not in self.seasons:
+            ddf_grid, night = self.get(
+                data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+            )
+            unights, indx = np.unique(night, return_index=True)
+            night_season = calc_season(ddf_RA, ddf_grid["mjd"][indx], season_mjd_start)
+            self.seasons[key] = night_season - np.floor(np.min(night_season))
+        return self.seasons[key]
+
+
+DDF_GRID_CACHE = DDFGridCache()
+
+
 def ddf_slopes(
     ddf_name,
     raw_obs,
@@ -33,16 +392,17 @@ def ddf_slopes(
     ----------
     ddf_name : `str`
        The DDF name to use
-    raw_obs : `np.array`, (N,)
+    raw_obs : `np.array`, (N,) or (M, N)
         An array with values of 1 or zero. One element per night, value of
         1 indicates the night is during an active observing season.
-    night_season : `np.array`, (N,)
+        Can be 2D to compute M DDFs (or candidate cadences) at once.
+    night_season : `np.array`, (N,) or (M, N)
         An array of floats with the fractional season value.
         Season values range from 0-1 for the first season;
         0.5 would be the "peak" of seasonal visibility.
         These should ONLY be the night the field should be 'active'
         (take out the season ends first).
-    season_seq : `int`, optional
+    season_seq : `int` or `np.array` (M,), optional
         Number of sequences to try to place into each season.
         Default of 30.
     min_season_length : `float`, optional
@@ -58,58 +418,123 @@ def ddf_slopes(
     boost_factor_fractional : `float`
         If there is an initial partial season, also boost that one by
         the given factor.
-    """
-
-    int_season = np.floor(night_season)
 
-    n_season = night_season[np.where(raw_obs)]
-    r_season = int_season[np.where(raw_obs)]
-    season_list = np.unique(r_season)
+    Returns
+    -------
+    cumulative_desired : `np.array`, (N,) or (M, N)
+        The desired cumulative number of sequences on each night.
+    """
+    single = np.ndim(raw_obs) == 1
+    raw_obs = np.atleast_2d(raw_obs)
+    night_season = np.atleast_2d(night_season)
+    n_ddf, n_nights = raw_obs.shape
+    season_seq = np.broadcast_to(season_seq, (n_ddf,))
+
+    int_season = np.floor(night_season).astype(int).ravel()
+
+    # One sort puts every (ddf, season) in a contiguous segment,
+    # in ddf then season order.
+    min_season = int_season.min()
+    n_seasons = int_season.max() - min_season + 1
+    ddf_indx = np.repeat(np.arange(n_ddf), n_nights)
+    key = ddf_indx * n_seasons + int_season - min_season
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    new_seg = np.concatenate(([True], key[1:] != key[:-1]))
+    seg_starts = np.where(new_seg)[0]
+    seg = np.cumsum(new_seg) - 1
+    seg_ddf = key[seg_starts] // n_seasons
+    seg_season = key[seg_starts] % n_seasons + min_season
+    s_raw = raw_obs.ravel()[order]
+    s_season = night_season.ravel()[order]
+
+    # Only seasons with some active nights count
+    active = s_raw != 0
+    seg_active = np.add.reduceat(active, seg_starts) > 0
 
     # Calculate season length for each season
     # In general this should be the same each season except for first and last
-    season_length = np.zeros(len(season_list), float)
-    for i, season in enumerate(season_list):
-        match = np.where(r_season == season)
-        season_length[i] = n_season[match].max() - n_season[match].min()
+    season_length = np.maximum.reduceat(
+        np.where(active, s_season, -np.inf), seg_starts
+    ) - np.minimum.reduceat(np.where(active, s_season, np.inf), seg_starts)
+    season_length[~seg_active] = 0
+    max_length = np.zeros(n_ddf)
+    np.maximum.at(max_length, seg_ddf[seg_active], season_length[seg_active])
 
     # Determine goal number of sequences in each season.
-    season_vals = np.ones(len(season_list), float) * season_seq
     # Adjust other seasons, relative to the max season length.
-    season_vals = season_vals * season_length / np.max(season_length)
+    season_vals = np.zeros(seg_starts.size, dtype=float)
+    season_vals[seg_active] = (
+        season_seq[seg_ddf[seg_active]]
+        * season_length[seg_active]
+        / max_length[seg_ddf[seg_active]]
+    )
     # EXCEPT - throw out seasons which are too short
-    too_short = np.where(season_length < (min_season_length / 365.25))
-    season_vals[too_short] = 0
+    season_vals[season_length < (min_season_length / 365.25)] = 0
 
     # Add extra adjustment to boost visits in seasons 0, 1, and 2
     # and maybe -1.
     if boost_early_factor is not None:
-        early_season = np.where(season_list == -1)[0]
-        if (len(early_season) > 0) & (boost_factor_fractional > 0):
-            season_vals[early_season] = season_seq * boost_factor_fractional
-        first_full_two_seasons = np.where((season_list == 0) | (season_list == 1))
-        season_vals[first_full_two_seasons] *= boost_early_factor
-        third_season = np.where(season_list == 2)
-        season_vals[third_season] *= boost_factor_third
+        if boost_factor_fractional > 0:
+            early_season = seg_active & (seg_season == -1)
+            season_vals[early_season] = (
+                season_seq[seg_ddf[early_season]] * boost_factor_fractional
+            )
+        season_vals[(seg_season == 0) | (seg_season == 1)] *= boost_early_factor
+        season_vals[seg_season == 2] *= boost_factor_third
 
     # Round the season_vals -- we're looking for integer numbers of sequences
     season_vals = np.round(season_vals)
+    season_vals[~seg_active] = 0
 
     # assign cumulative values
-    cumulative_desired = np.zeros(raw_obs.size, dtype=float)
-    for i, season in enumerate(season_list):
-        this_season = np.where(int_season == season)
-        # raw_obs gives a way to scale the season_vals across the nights
-        # in the season -- raw_obs = 1 for peak of season, 0 when
-        # beyond the season_unobs_frac, and a fraction for low_season_frac
-        cumulative = np.cumsum(raw_obs[this_season])
-        if cumulative.max() > 0:
-            cumulative = cumulative / cumulative.max() * season_vals[i]
-            cumulative_desired[this_season] = cumulative + np.max(cumulative_desired)
+    # raw_obs gives a way to scale the season_vals across the nights
+    # in the season -- raw_obs = 1 for peak of season, 0 when
+    # beyond the season_unobs_frac, and a fraction for low_season_frac.
+    # Pad each season into a row so the cumsum restarts for every season.
+    n_per_seg = np.diff(np.append(seg_starts, s_raw.size))
+    pos = np.arange(s_raw.size) - seg_starts[seg]
+    padded = np.zeros((seg_starts.size, n_per_seg.max()))
+    padded[seg, pos] = s_raw
+    cumulative = np.cumsum(padded, axis=1)
+    seg_max = cumulative.max(axis=1)
+    cumulative = cumulative[seg, pos]
+
+    # Each season starts where the last one left off
+    fills = seg_active & (seg_max > 0)
+    seg_total = np.where(fills, season_vals, 0)
+    offset = np.cumsum(seg_total) - seg_total
+    ddf_starts = np.searchsorted(seg_ddf, np.arange(n_ddf))
+    offset -= offset[ddf_starts][seg_ddf]
+
+    s_cumulative = np.zeros(s_raw.size, dtype=float)
+    in_fill = fills[seg]
+    s_cumulative[in_fill] = (
+        cumulative[in_fill] / seg_max[seg][in_fill] * season_vals[seg][in_fill]
+        + offset[seg][in_fill]
+    )
+
+    cumulative_desired = np.zeros(s_raw.size, dtype=float)
+    cumulative_desired[order] = s_cumulative
+    cumulative_desired = cumulative_desired.reshape(n_ddf, n_nights)
+    if single:
+        cumulative_desired = cumulative_desired[0]
 
     return cumulative_desired
 
 
+def _find_free(parent, indx):
+    """Find the smallest free slot >= indx in a union-find "next free
+    slot" structure, compressing the path along the way.
+    """
+    root = indx
+    while parent[root] != root:
+        root = parent[root]
+    while parent[indx] != root:
+        parent[indx], indx = root, parent[indx]
+    return root
+
+
 def match_cumulative(cumulative_desired, mask=None, no_duplicate=True):
     """Generate a schedule that tries to match the desired cumulative
     distribution given a mask
@@ -136,35 +561,229 @@ def match_cumulative(cumulative_desired, mask=None, no_duplicate=True):
     if mask is None:
         mask = np.ones(sched.size)
 
-    valid = np.where(mask > 0)[0].tolist()
-    x = np.arange(sched.size)
+    valid = np.where(mask > 0)[0]
 
     drd = np.diff(rounded_desired)
     step_points = np.where(drd > 0)[0] + 1
 
-    # would be nice to eliminate this loop, but it's not too bad.
-    # can't just use searchsorted on the whole array, because then there
-    # can be duplicate values, and array[[n,n]] = 1 means that extra
-    # match gets lost.
-    for indx in step_points:
-        left = np.searchsorted(x[valid], indx)
-        right = np.searchsorted(x[valid], indx, side="right")
-        d1 = indx - left
-        d2 = right - indx
-        if d1 < d2:
-            sched_at = left
-        else:
-            sched_at = right
+    # Each step point goes to the first valid element at or after it,
+    # or the one after that if the step lands on a valid element that
+    # has a gap somewhere before it. Off the end, take the last valid one.
+    if not no_duplicate:
+        left = np.searchsorted(valid, step_points)
+        right = np.searchsorted(valid, step_points, side="right")
+        sched_at = np.where(step_points - left < right - step_points, left, right)
+        sched_at[sched_at >= valid.size] -= 1
+        np.add.at(sched, valid[sched_at], 1)
+        return sched
+
+    # With no duplicates, valid elements get used up as we go. Track the
+    # free elements with a union-find "next free slot" structure so each
+    # step point is O(1) amortized rather than rebuilding the valid list.
+    n = sched.size
+    free = np.zeros(n, dtype=bool)
+    free[valid] = True
+    free = free.tolist()
+    parent = [i if free[i] else i + 1 for i in range(n)] + [n]
+    # Smallest element that is not free. Only ever decreases.
+    first_gap = free.index(False) if False in free else n
+    # Largest element that is still free. Only ever decreases.
+    last = int(valid[-1]) if valid.size > 0 else -1
+
+    for indx in step_points.tolist():
+        sched_at = _find_free(parent, indx)
+        if sched_at == n:
+            # If we are off the end
+            sched_at = last
+        elif (sched_at == indx) & (first_gap < indx):
+            sched_at = _find_free(parent, indx + 1)
+            if sched_at == n:
+                sched_at = indx
+        if sched_at < 0:
+            raise IndexError("No valid elements left to schedule")
+
+        sched[sched_at] += 1
+        free[sched_at] = False
+        parent[sched_at] = sched_at + 1
+        first_gap = min(first_gap, sched_at)
+        while (last >= 0) and not free[last]:
+            last -= 1
 
-        # If we are off the end
-        if sched_at >= len(valid):
-            sched_at -= 1
+    return sched
 
-        sched[valid[sched_at]] += 1
-        if no_duplicate:
-            valid.pop(sched_at)
 
-    return sched
+def _night_argmax(night, values, good, nights, night_index=None):
+    """Find the grid point with the maximum value in each requested night
+
+    Parameters
+    ----------
+    night : `np.array`, (N,)
+        The night of each grid point. Assumed sorted, as it is for
+        a grid in MJD order.
+    values : `np.array`, (N,)
+        The values to maximize (e.g., m5 in g).
+    good : `np.array`, bool (N,)
+        Grid points which are allowed to be picked.
+    nights : `np.array`, (M,)
+        The nights to find the best grid point for. Each should
+        have at least one good grid point.
+    night_index : `tuple` of `np.array`, optional
+        The unique nights and the index of the first grid point in
+        each, from ``np.unique(night, return_index=True)``.
+        Default None computes it.
+
+    Returns
+    -------
+    indx : `np.array`, int (M,)
+        Index into the grid of the first maximum value in each night.
+    """
+    # night -> grid slice index, each night is a contiguous run
+    if night_index is None:
+        night_index = np.unique(night, return_index=True)
+    unights, starts = night_index
+    n_per_night = np.diff(np.append(starts, night.size))
+    seg = np.repeat(np.arange(unights.size), n_per_night)
+
+    # segmented max over the masked grid
+    masked = np.where(good, values, -np.inf)
+    night_max = np.maximum.reduceat(masked, starts)
+
+    # hits are in grid order, so the first one per night wins ties
+    hits = np.where(good & (masked == night_max[seg]))[0]
+    hit_nights, first = np.unique(seg[hits], return_index=True)
+    best = np.zeros(unights.size, dtype=int) - 1
+    best[hit_nights] = hits[first]
+
+    return best[np.searchsorted(unights, nights)]
+
+
+# Largest move _refine_times makes, in grid steps
+_MAX_REFINE_OFFSET = 0.49
+
+
+def _refine_times(grid_mjd, m5_g, airmass, good, indx):
+    """Sub-grid times for chosen grid points
+
+    A parabola through each grid point and its neighbours is fit to
+    m5_g, and the time is moved to its peak. Where m5_g has no peak,
+    the airmass minimum is used instead. Times only move toward good
+    neighbours, and by less than half a grid step, so the chosen grid
+    point is still the nearest one (see `nearest_grid_index`).
+
+    Parameters
+    ----------
+    grid_mjd, m5_g, airmass : `np.array`, (N,)
+        The grid times, and the g band depth and airmass of the field.
+    good : `np.array`, bool (N,)
+        Grid points a sequence is allowed to start at.
+    indx : `np.array`, int (M,)
+        The chosen grid points.
+
+    Returns
+    -------
+    mjds : `np.array`, (M,)
+        The refined start time for each chosen grid point.
+    """
+    indx = np.asarray(indx, dtype=int)
+    left = np.maximum(indx - 1, 0)
+    right = np.minimum(indx + 1, grid_mjd.size - 1)
+    interior = (indx > 0) & (indx < grid_mjd.size - 1)
+    left_ok = interior & good[left]
+    right_ok = interior & good[right]
+
+    offset = np.zeros(indx.size)
+    fitted = np.zeros(indx.size, dtype=bool)
+    # m5_g should curve down to a peak, airmass up to a minimum
+    for values, sign in ((m5_g, -1.0), (airmass, 1.0)):
+        y_left, y_mid, y_right = values[left], values[indx], values[right]
+        curvature = y_left - 2.0 * y_mid + y_right
+        with np.errstate(invalid="ignore"):
+            fit = ~fitted & (left_ok | right_ok) & (sign * curvature > 0)
+        offset[fit] = 0.5 * (y_left - y_right)[fit] / curvature[fit]
+        fitted |= fit
+
+    offset = np.where(left_ok, offset, np.maximum(offset, 0.0))
+    offset = np.where(right_ok, offset, np.minimum(offset, 0.0))
+    # Not all the way to half a step, where nearest_grid_index would
+    # round to the next grid point
+    offset = np.clip(offset, -_MAX_REFINE_OFFSET, _MAX_REFINE_OFFSET)
+    step = np.where(
+        offset < 0, grid_mjd[indx] - grid_mjd[left], grid_mjd[right] - grid_mjd[indx]
+    )
+    return grid_mjd[indx] + offset * step
+
+
+def _field_mask(
+    ddf_name,
+    ddf_grid,
+    sun_limit=-18,
+    sequence_time=60.0,
+    airmass_limit=2.5,
+    sky_limit=None,
+    g_depth_limit=23.5,
+):
+    """Grid points where a DDF passes the sun, airmass, sky and depth
+    limits. See `optimize_ddf_times` for parameters.
+
+    Returns
+    -------
+    mask : `GridMask`
+        The usable grid points.
+    """
+    # Comparisons are written so NaN values pass or fail the same
+    # way they always have.
+    sun_up = GridMask.from_bool(ddf_grid["sun_alt"] >= np.radians(sun_limit))
+    # expand sun mask backwards by the sequence time.
+    n_back = int(
+        np.ceil(sequence_time / 60.0 / 24.0 / (ddf_grid["mjd"][1] - ddf_grid["mjd"][0]))
+    )
+    mask = ~(sun_up | sun_up.shift(n_back))
+
+    mask &= ~GridMask.from_bool(ddf_grid["%s_airmass" % ddf_name] >= airmass_limit)
+
+    if sky_limit is not None:
+        mask &= GridMask.from_bool(ddf_grid["%s_sky_g" % ddf_name] > sky_limit)
+
+    m5 = ddf_grid["%s_m5_g" % ddf_name]
+    m5_ok = np.isfinite(m5)
+    if g_depth_limit is not None:
+        m5_ok &= ~(m5 < g_depth_limit)
+    mask &= GridMask.from_bool(m5_ok)
+
+    return mask
+
+
+def _sequence_mask(
+    ddf_grid,
+    night,
+    field_mask,
+    mask_even_odd=None,
+    moon_illum_lt=None,
+    moon_illum_gt=None,
+):
+    """Grid points where a sequence can go: the field mask, less any
+    masked nights and moon phases. See `optimize_ddf_times` for parameters.
+
+    Returns
+    -------
+    mask : `GridMask`
+        The usable grid points.
+    """
+    mask = field_mask
+
+    if mask_even_odd is not None:
+        if mask_even_odd:
+            mask &= GridMask.from_bool(night % 2 != 0)
+        else:
+            mask &= GridMask.from_bool(night % 2 == 0)
+
+    # If both are set, moon_illum_gt wins
+    if moon_illum_gt is not None:
+        mask &= ~GridMask.from_bool(ddf_grid["moon_phase"] < moon_illum_gt)
+    elif moon_illum_lt is not None:
+        mask &= ~GridMask.from_bool(ddf_grid["moon_phase"] > moon_illum_lt)
+
+    return mask
 
 
 def optimize_ddf_times(
@@ -188,6 +807,11 @@ def optimize_ddf_times(
     mask_even_odd=None,
     moon_illum_lt=None,
     moon_illum_gt=None,
+    night=None,
+    night_season=None,
+    night_index=None,
+    field_mask=None,
+    refine_times=False,
 ):
     """
 
@@ -252,82 +876,69 @@ def optimize_ddf_times(
     mask_even_odd : `bool`
         If True, mask even nights, if False, mask odd. Default
         None masks nothing.
+    night : `np.array`, optional
+        The night of each grid point. Default None computes it
+        from ddf_grid.
+    night_season : `np.array`, optional
+        The season of each unique night, already shifted to start at
+        season 0 (see `DDFGridCache.night_season`). Default None
+        computes it.
+    night_index : `tuple` of `np.array`, optional
+        The unique nights and the index of the first grid point in
+        each (see `DDFGridCache.night_index`). Default None computes it.
+    field_mask : `GridMask`, optional
+        The grid points that pass the sun, airmass, sky and depth
+        limits (see `DDFGridCache.field_mask`). Must have been made
+        with the same limits as passed here. Default None computes it.
+    refine_times : `bool`
+        Fit the g band depth (or airmass) around the best grid point in
+        each night to place the sequence between grid points.
+        Default False returns grid point times.
     """
     # Convert to fraction for convienence
     season_unobs_frac = offseason_length / 365.25
 
-    # Convert sun_limit and sequence_time to values expected internally.
-    sun_limit = np.radians(sun_limit)
-    sequence_time = sequence_time / 60.0 / 24.0  # to days
-
     # Calculate the night value for each grid point.
-    almanac = Almanac(mjd_start=ddf_grid["mjd"].min())
-    almanac_indx = almanac.mjd_indx(ddf_grid["mjd"])
-    night = almanac.sunsets["night"][almanac_indx]
-
-    ngrid = ddf_grid["mjd"].size
-
-    # Set the sun mask.
-    sun_mask = np.ones(ngrid, dtype=int)
-    sun_mask[np.where(ddf_grid["sun_alt"] >= sun_limit)] = 0
-    # expand sun mask backwards by the sequence time.
-    n_back = np.ceil(sequence_time / (ddf_grid["mjd"][1] - ddf_grid["mjd"][0])).astype(
-        int
+    if night is None:
+        almanac = DDF_GRID_CACHE.almanac(ddf_grid["mjd"].min())
+        almanac_indx = almanac.mjd_indx(ddf_grid["mjd"])
+        night = almanac.sunsets["night"][almanac_indx]
+
+    # The sun, airmass, sky and m5 masks only depend on the field
+    # and limits, so they can be computed once and reused.
+    if field_mask is None:
+        field_mask = _field_mask(
+            ddf_name,
+            ddf_grid,
+            sun_limit=sun_limit,
+            sequence_time=sequence_time,
+            airmass_limit=airmass_limit,
+            sky_limit=sky_limit,
+            g_depth_limit=g_depth_limit,
+        )
+    big_mask = _sequence_mask(
+        ddf_grid,
+        night,
+        field_mask,
+        mask_even_odd=mask_even_odd,
+        moon_illum_lt=moon_illum_lt,
+        moon_illum_gt=moon_illum_gt,
     )
-    shadow_indx = np.where(sun_mask == 0)[0] - n_back
-    shadow_indx = shadow_indx[np.where(shadow_indx >= 0)]
-    sun_mask[shadow_indx] = 0
-
-    # Set the airmass mask.
-    airmass_mask = np.ones(ngrid, dtype=int)
-    airmass_mask[np.where(ddf_grid["%s_airmass" % ddf_name] >= airmass_limit)] = 0
-
-    # Set the sky_limit mask, if provided.
-    sky_mask = np.ones(ngrid, dtype=int)
-    if sky_limit is not None:
-        sky_mask[np.where(ddf_grid["%s_sky_g" % ddf_name] <= sky_limit)] = 0
-        sky_mask[np.where(np.isnan(ddf_grid["%s_sky_g" % ddf_name]))] = 0
-
-    # Set the m5 / g_depth_limit mask if provided.
-    m5_mask = np.zeros(ngrid, dtype=bool)
-    m5_mask[np.isfinite(ddf_grid["%s_m5_g" % ddf_name])] = 1
-    if g_depth_limit is not None:
-        m5_mask[np.where(ddf_grid["%s_m5_g" % ddf_name] < g_depth_limit)] = 0
-
-    eo_mask = 1
-    if mask_even_odd is not None:
-        eo_mask = np.ones(ngrid, dtype=bool)
-        is_odd_indx = night % 2 != 0
-        is_even_indx = night % 2 == 0
-        if mask_even_odd:
-            eo_mask[is_even_indx] = 0
-        else:
-            eo_mask[is_odd_indx] = 0
 
-    moon_illum_mask = 1
-    if moon_illum_lt is not None:
-        moon_illum_mask = np.ones(ngrid, dtype=bool)
-        indx = np.where(ddf_grid["moon_phase"] > moon_illum_lt)[0]
-        moon_illum_mask[indx] = 0
-    if moon_illum_gt is not None:
-        moon_illum_mask = np.ones(ngrid, dtype=bool)
-        indx = np.where(ddf_grid["moon_phase"] < moon_illum_gt)[0]
-        moon_illum_mask[indx] = 0
-
-    # Combine the masks.
-    big_mask = sun_mask * airmass_mask * sky_mask * m5_mask * eo_mask * moon_illum_mask
-
-    # Identify which nights are useful to preschedule DDF visits.
-    potential_nights = np.unique(night[np.where(big_mask > 0)])
     # prevent a repeat sequence in a night
-    unights, indx = np.unique(night, return_index=True)
+    if night_index is None:
+        night_index = np.unique(night, return_index=True)
+    unights, indx = night_index
+    # Identify which nights are useful to preschedule DDF visits.
+    usable_nights = big_mask.segment_counts(indx) > 0
     night_mjd = ddf_grid["mjd"][indx]
 
     # Calculate season values for each night.
-    night_season = calc_season(ddf_RA, night_mjd, mjd_start)
+    if night_season is None:
+        night_season = calc_season(ddf_RA, night_mjd, mjd_start)
 
-    # convert so we start at season 0 no matter what.
-    night_season = night_season - np.floor(np.min(night_season))
+        # convert so we start at season 0 no matter what.
+        night_season = night_season - np.floor(np.min(night_season))
 
     # only making a fit for a single season.
     if only_season is not None:
@@ -335,6 +946,7 @@ def optimize_ddf_times(
         night_season = night_season[indx]
         unights = unights[indx]
         night_mjd = night_mjd[indx]
+        usable_nights = usable_nights[indx]
 
     # Mod by 1 to turn the season value in each night a simple 0-1 value
     season_mod = night_season % 1
@@ -372,10 +984,7 @@ def optimize_ddf_times(
 
     # Identify which nights (only scheduling 1 sequence per night)
     # would be usable, based on the masks above.
-    night_mask = unights * 0
-    # which unights are in potential nights
-    indx = np.isin(unights, potential_nights)
-    night_mask[indx] = 1
+    night_mask = usable_nights.astype(int)
 
     # scale things down if we don't have enough nights
     n_possible_nights = np.sum(night_mask)
@@ -395,24 +1004,454 @@ def optimize_ddf_times(
     nights_to_use = unights[np.where(unight_sched == 1)]
 
     # For each night, find the best time in the night and preschedule the DDF.
-    # XXX--probably need to expand this part to resolve the times when
-    # multiple things get scheduled
-    mjds = []
-    for night_check in nights_to_use:
-        in_night = np.where(
-            (night == night_check)
-            & (np.isfinite(ddf_grid["%s_m5_g" % ddf_name]))
-            & (big_mask > 0)
-        )[0]
-        m5s = ddf_grid["%s_m5_g" % ddf_name][in_night]
-        # we could intorpolate this to get even better than 15 min
-        # resolution on when to observe
-        max_indx = np.where(m5s == m5s.max())[0].min()
-        mjds.append(ddf_grid["mjd"][in_night[max_indx]])
+    # Times where other fields also get scheduled are sorted out later
+    # by `resolve_ddf_conflicts`.
+    m5_g = ddf_grid["%s_m5_g" % ddf_name]
+    good = np.isfinite(m5_g) & big_mask.to_bool()
+    best_indx = _night_argmax(
+        night,
+        m5_g,
+        good,
+        nights_to_use,
+        night_index=night_index,
+    )
+    # Interpolate to get better than the grid resolution on when
+    # to observe
+    if refine_times:
+        mjds = list(
+            _refine_times(
+                ddf_grid["mjd"],
+                m5_g,
+                ddf_grid["%s_airmass" % ddf_name],
+                good,
+                best_indx,
+            )
+        )
+    else:
+        mjds = list(ddf_grid["mjd"][best_indx])
 
     return mjds, night_mjd, cumulative_desired, cumulative_sched
 
 
+def _row_settings(row, expt, nsnaps, overhead=2.0, illum_limit=40.0):
+    """The `optimize_ddf_times` settings for one row of a DDF config file
+
+    Returns
+    -------
+    limits : `dict`
+        The sun, airmass, sky and depth limits, which set the field
+        mask (see `DDFGridCache.field_mask`). sequence_time is in minutes.
+    options : `dict`
+        The season and night selection for the row.
+    """
+    sequence_time = 0.0
+    for bandname in "ugrizy":
+        sequence_time += (expt[bandname] + overhead * nsnaps[bandname]) * row[bandname]
+
+    u_only = False
+    y_only = False
+    sum_filters = row["u"] + row["g"] + row["r"] + row["i"] + row["z"] + row["y"]
+    if sum_filters == row["u"]:
+        u_only = True
+    elif sum_filters == row["y"]:
+        y_only = True
+
+    # XXX--need to catch if only u or only y, then
+    # put in some lunar illumination masks maybe.
+
+    mask_even_odd = None
+    if row["even_odd_None"].strip() == "even":
+        mask_even_odd = True
+    elif row["even_odd_None"].strip() == "odd":
+        mask_even_odd = False
+
+    moon_illum_gt = None
+    moon_illum_lt = None
+    if u_only:
+        moon_illum_lt = illum_limit
+    if y_only:
+        moon_illum_gt = illum_limit
+
+    limits = {
+        "sun_limit": -18,
+        "sequence_time": sequence_time / 60.0,
+        "airmass_limit": 2.5,
+        "sky_limit": None,
+        "g_depth_limit": row["g_depth_limit"],
+    }
+    options = {
+        "offseason_length": (365.0 - row["season_length"]) / 2.0,  # stupid factor of 2
+        "season_seq": row["n_sequences"],
+        "only_season": row["season"],
+        "mask_even_odd": mask_even_odd,
+        "moon_illum_lt": moon_illum_lt,
+        "moon_illum_gt": moon_illum_gt,
+    }
+    return limits, options
+
+
+def config_row_sequences(
+    row,
+    data_file=None,
+    mjd_start=SURVEY_START_MJD,
+    survey_length=10.0,
+    expt={"u": 38, "g": 29.2, "r": 29.2, "i": 29.2, "z": 29.2, "y": 29.2},
+    nsnaps={"u": 1, "g": 2, "r": 2, "i": 2, "z": 2, "y": 2},
+    overhead=2.0,
+    illum_limit=40.0,
+    moon_min_distance=np.radians(25.0),
+    refine_times=False,
+):
+    """Optimize the sequence times for a single row of a DDF config file
+
+    Rows are independent of each other, so this can be farmed out to
+    worker processes. See `generate_ddf_scheduled_obs` for parameters,
+    except moon_min_distance is in radians.
+
+    Returns
+    -------
+    mjds : `np.array`
+        The MJD of each sequence.
+    flush_length : `float`
+        How long to keep the sequence around before flushing (days).
+    seq_names, seq_bands, seq_moon_dists : `list`
+        The DDF name, band, and moon_min_distance of each
+        visit in one sequence.
+    """
+    ddfs = ddf_locations()
+    ddf_grid, night = DDF_GRID_CACHE.get(
+        data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+    )
+
+    ddf_name = row["ddf_name"]
+    flush_length = row["flush_length"]
+    sequence_dict = {bandname: row[bandname] for bandname in "ugrizy"}
+    limits, options = _row_settings(
+        row, expt=expt, nsnaps=nsnaps, overhead=overhead, illum_limit=illum_limit
+    )
+    grid_kwargs = {
+        "data_file": data_file,
+        "mjd_start": mjd_start,
+        "survey_length": survey_length,
+    }
+    mjds = optimize_ddf_times(
+        ddf_name,
+        ddfs[ddf_name][0],
+        ddf_grid,
+        **limits,
+        **options,
+        low_season_frac=0,
+        low_season_rate=0.3,
+        mjd_start=SURVEY_START_MJD,
+        night=night,
+        night_season=DDF_GRID_CACHE.night_season(
+            ddfs[ddf_name][0], season_mjd_start=SURVEY_START_MJD, **grid_kwargs
+        ),
+        night_index=DDF_GRID_CACHE.night_index(**grid_kwargs),
+        field_mask=DDF_GRID_CACHE.field_mask(ddf_name, **limits, **grid_kwargs),
+        refine_times=refine_times,
+    )[0]
+
+    # Every sequence for this row is the same list of visits, so
+    # build it once and repeat it for each mjd later.
+    if "EDFS" in ddf_name:
+        # EDFS is split across the a and b pointings. Note the
+        # EDFS_a half has never had moon_min_distance set.
+        names = [ddf_name, ddf_name.replace("_a", "_b")]
+        moon_dists = [0.0, moon_min_distance]
+    else:
+        names = [ddf_name]
+        moon_dists = [moon_min_distance]
+    seq_names = []
+    seq_bands = []
+    seq_moon_dists = []
+    for bandname in sequence_dict:
+        if "EDFS" in ddf_name:
+            n_visits = int(np.ceil(sequence_dict[bandname] / 2))
+        else:
+            n_visits = sequence_dict[bandname]
+        for name, moon_dist in zip(names, moon_dists):
+            seq_names += [name] * n_visits
+            seq_bands += [bandname] * n_visits
+            seq_moon_dists += [moon_dist] * n_visits
+
+    return (
+        np.array(mjds, dtype=float),
+        flush_length,
+        seq_names,
+        seq_bands,
+        seq_moon_dists,
+    )
+
+
+def nearest_grid_index(grid_mjd, mjds):
+    """Index of the closest grid point to each mjd
+
+    Parameters
+    ----------
+    grid_mjd : `np.array`
+        The grid times, sorted.
+    mjds : `np.array`
+        The times to look up.
+
+    Returns
+    -------
+    indx : `np.array`
+        Index into grid_mjd for each mjd. A time exactly half way
+        between two grid points goes to the later one.
+    """
+    indx = np.clip(np.searchsorted(grid_mjd, mjds), 1, grid_mjd.size - 1)
+    left_closer = (mjds - grid_mjd[indx - 1]) < (grid_mjd[indx] - mjds)
+    return indx - left_closer
+
+
+def _is_free(t0, duration, placed, gap):
+    """Whether a block starting at t0 misses all the placed (start, end)
+    blocks by at least gap"""
+    t1 = t0 + duration
+    return all((t0 >= end + gap) or (t1 + gap <= start) for start, end in placed)
+
+
+def resolve_ddf_conflicts(
+    rows,
+    row_mjds,
+    data_file=None,
+    mjd_start=SURVEY_START_MJD,
+    survey_length=10.0,
+    expt={"u": 38, "g": 29.2, "r": 29.2, "i": 29.2, "z": 29.2, "y": 29.2},
+    nsnaps={"u": 1, "g": 2, "r": 2, "i": 2, "z": 2, "y": 2},
+    overhead=2.0,
+    illum_limit=40.0,
+    gap=2.0,
+    refine_times=False,
+):
+    """Move DDF sequences so different fields are not scheduled at the
+    same time
+
+    `optimize_ddf_times` places each config row on its own, so two
+    fields can be put at the same time on the same night, and one of
+    them goes stale in the queue while the other is observed.
+
+    Sequences of the same field that start at the same time are kept
+    together as one block, as the config rows are meant to be observed
+    back to back (e.g., a u sequence along with a g+i one). Overlapping
+    blocks are then repaired greedily, the block with the fewest usable
+    grid points in the night first. A block keeps its time if that is
+    still free, otherwise it moves to the free grid point in the same
+    night with the deepest g band m5 that passes the limits of all its
+    rows and finishes before twilight. Blocks with nowhere to go stay
+    where they were.
+
+    Parameters
+    ----------
+    rows : `list` of `pd.Series`
+        The config rows.
+    row_mjds : `list` of `np.array`
+        The sequence MJDs of each row, from `config_row_sequences`.
+    gap : `float`
+        Time to leave between blocks of different fields, for the slew
+        and band change (minutes). Default 2.
+    data_file, mjd_start, survey_length, expt, nsnaps, overhead, illum_limit
+        See `generate_ddf_scheduled_obs`.
+    refine_times : `bool`
+        Try moved blocks at sub-grid times, as `optimize_ddf_times`
+        does with refine_times. Default False.
+
+    Returns
+    -------
+    row_mjds : `list` of `np.array`
+        The sequence MJDs of each row, with conflicts moved.
+    n_unresolved : `int`
+        Number of blocks that still overlap another block.
+    """
+    grid_kwargs = {
+        "data_file": data_file,
+        "mjd_start": mjd_start,
+        "survey_length": survey_length,
+    }
+    ddf_grid, night = DDF_GRID_CACHE.get(**grid_kwargs)
+    unights, starts = DDF_GRID_CACHE.night_index(**grid_kwargs)
+    ends = np.append(starts[1:], night.size)
+    # Plain arrays, indexing the memory map is slow in a loop
+    grid_mjd = np.array(ddf_grid["mjd"])
+    m5_g = {}
+    airmass = {}
+    step = grid_mjd[1] - grid_mjd[0]
+    gap = gap / 60.0 / 24.0
+
+    # Usable grid points of each row. Rows with the same settings
+    # share a mask.
+    masks = {}
+    sun_up = {}
+    row_info = []
+    for row in rows:
+        limits, options = _row_settings(
+            row, expt=expt, nsnaps=nsnaps, overhead=overhead, illum_limit=illum_limit
+        )
+        night_options = {
+            key: options[key]
+            for key in ["mask_even_odd", "moon_illum_lt", "moon_illum_gt"]
+        }
+        mask_key = (row["ddf_name"],) + tuple(sorted(limits.items()))
+        mask_key += tuple(sorted(night_options.items()))
+        if mask_key not in masks:
+            field_mask = DDF_GRID_CACHE.field_mask(
+                row["ddf_name"], **limits, **grid_kwargs
+            )
+            masks[mask_key] = _sequence_mask(
+                ddf_grid, night, field_mask, **night_options
+            ).to_bool()
+        if row["ddf_name"] not in m5_g:
+            m5_g[row["ddf_name"]] = np.array(ddf_grid["%s_m5_g" % row["ddf_name"]])
+            airmass[row["ddf_name"]] = np.array(
+                ddf_grid["%s_airmass" % row["ddf_name"]]
+            )
+        if limits["sun_limit"] not in sun_up:
+            sun_up[limits["sun_limit"]] = ddf_grid["sun_alt"] >= np.radians(
+                limits["sun_limit"]
+            )
+        row_info.append(
+            (
+                row["ddf_name"],
+                limits["sequence_time"] / 60.0 / 24.0,
+                mask_key,
+                limits["sun_limit"],
+            )
+        )
+
+    # Group sequences into blocks: (field, grid index) -> [(row, sequence)]
+    blocks = {}
+    for i, mjds in enumerate(row_mjds):
+        if np.size(mjds) == 0:
+            continue
+        for j, gi in enumerate(nearest_grid_index(grid_mjd, mjds)):
+            blocks.setdefault((row_info[i][0], gi), []).append((i, j))
+
+    # Blocks by night
+    keys = list(blocks.keys())
+    block_night = np.searchsorted(starts, [gi for _, gi in keys], side="right") - 1
+    by_night = {}
+    for key, ni in zip(keys, block_night):
+        by_night.setdefault(ni, []).append(key)
+
+    new_mjds = [np.array(mjds, dtype=float) for mjds in row_mjds]
+    n_unresolved = 0
+    for ni, night_keys in by_night.items():
+        if len(night_keys) == 1:
+            continue
+        durations = {
+            key: sum(row_info[i][1] for i, _ in blocks[key]) for key in night_keys
+        }
+        # Check for overlaps before doing any real work, most nights
+        # have none.
+        block_time = {
+            key: min(row_mjds[i][j] for i, j in blocks[key]) for key in night_keys
+        }
+        night_keys.sort(key=lambda key: block_time[key])
+        block_start = np.array([block_time[key] for key in night_keys])
+        block_end = block_start + np.array([durations[key] for key in night_keys])
+        if np.all(block_start[1:] >= np.maximum.accumulate(block_end[:-1]) + gap):
+            continue
+
+        # Grid points each block could go to
+        n_start, n_end = starts[ni], ends[ni]
+        candidates = {}
+        for key in night_keys:
+            usable = np.ones(n_end - n_start, dtype=bool)
+            for i, _ in blocks[key]:
+                usable &= masks[row_info[i][2]][n_start:n_end]
+            # The block as a whole has to finish before twilight
+            sun_limit = min(row_info[i][3] for i, _ in blocks[key])
+            n_after = int(np.ceil(durations[key] / step))
+            n_window = n_end - n_start + n_after
+            up = np.ones(n_window, dtype=bool)
+            stop = min(n_start + n_window, night.size)
+            up[: stop - n_start] = sun_up[sun_limit][n_start:stop]
+            n_up = np.concatenate([[0], np.cumsum(up)])
+            usable &= n_up[n_after + 1 :] == n_up[: n_end - n_start]
+            candidates[key] = usable
+
+        placed = []
+        for key in sorted(
+            night_keys, key=lambda key: (np.sum(candidates[key]), -durations[key])
+        ):
+            name, gi = key
+            choice = block_time[key]
+            if not _is_free(choice, durations[key], placed, gap):
+                # Try the other grid points, deepest first, at the
+                # times optimize_ddf_times would pick
+                usable = candidates[key]
+                indx = np.where(usable)[0]
+                indx = indx[np.argsort(-m5_g[name][n_start + indx], kind="stable")]
+                indx = indx[indx != gi - n_start]
+                if refine_times:
+                    times = _refine_times(
+                        grid_mjd[n_start:n_end],
+                        m5_g[name][n_start:n_end],
+                        airmass[name][n_start:n_end],
+                        usable,
+                        indx,
+                    )
+                else:
+                    times = grid_mjd[n_start + indx]
+                for t0 in times:
+                    if _is_free(t0, durations[key], placed, gap):
+                        choice = t0
+                        break
+                else:
+                    n_unresolved += 1
+            placed.append((choice, choice + durations[key]))
+            if choice != block_time[key]:
+                for i, j in blocks[key]:
+                    new_mjds[i][j] = choice
+
+    return new_mjds, n_unresolved
+
+
+def ddf_schedule_hash(ddf_config_file, data_file=None, **kwargs):
+    """Hash everything that goes into a DDF schedule
+
+    Parameters
+    ----------
+    ddf_config_file : `str` or `pd.DataFrame`
+        The DDF config file, or the config already read in.
+    data_file : `path` (None)
+        The DDF grid file. Default None uses the one in rubin_sim_data.
+    **kwargs
+        Any other parameters that change the schedule
+        (mjd_start, survey_length, expt, nsnaps, etc).
+
+    Returns
+    -------
+    sched_hash : `str`
+        Hex digest of the config and grid file contents, this module's
+        source, the rubin_scheduler version, and the kwargs.
+    """
+    if data_file is None:
+        data_file = _default_ddf_grid_file()
+    hasher = hashlib.sha256()
+    if isinstance(ddf_config_file, pd.DataFrame):
+        hasher.update(ddf_config_file.to_csv().encode())
+        ddf_config_file = None
+    for filename in [ddf_config_file, data_file, __file__]:
+        if filename is None:
+            continue
+        with open(filename, "rb") as infile:
+            for chunk in iter(lambda: infile.read(2**20), b""):
+                hasher.update(chunk)
+    hasher.update(getattr(rubin_scheduler, "__version__", "").encode())
+    hasher.update(repr(sorted(kwargs.items())).encode())
+    return hasher.hexdigest()
+
+
+def _config_row_key(row, row_params):
+    """Key identifying the result of `config_row_sequences`."""
+    row_values = tuple(
+        (column, str(value).strip()) for column, value in row.to_dict().items()
+    )
+    return (row_values, repr(sorted(row_params.items())))
+
+
 def generate_ddf_scheduled_obs(
     data_file=None,
     mjd_tol=15,
@@ -433,6 +1472,14 @@ def generate_ddf_scheduled_obs(
     ddf_config_file="ocean1.dat",
     overhead=2.0,
     illum_limit=40.0,
+    n_workers=None,
+    executor=None,
+    cache_dir=None,
+    refresh_cache=False,
+    previous=None,
+    return_rows=False,
+    resolve_conflicts=False,
+    refine_times=False,
 ):
     """
 
@@ -496,9 +1543,79 @@ def generate_ddf_scheduled_obs(
     illum_limit : `float`
         The moon illumination limit for when u and y are loaded.
         Default 40 (percent).
+    ddf_config_file : `str` or `pd.DataFrame`
+        The DDF config file, with one row per (field, season, sequence
+        type). Can also be a DataFrame of a config that has already
+        been read in (and possibly modified).
+    n_workers : `int`, optional
+        Number of processes to use to evaluate the config rows.
+        Default None evaluates them serially.
+    executor : `concurrent.futures.Executor`, optional
+        An existing executor to evaluate the config rows with,
+        used instead of n_workers. Default None.
+    cache_dir : `str`, optional
+        Directory to cache the resulting schedule in. If a schedule has
+        already been generated with the same inputs (see
+        `ddf_schedule_hash`), it is loaded rather than regenerated.
+        Default None does no caching.
+    refresh_cache : `bool`
+        Regenerate the schedule and overwrite any cached version.
+        Default False.
+    previous : `dict`, optional
+        The per-row results from an earlier call made with
+        return_rows=True. Rows of the config that are unchanged since
+        then (same field, season, and all other values, with the same
+        expt, nsnaps, etc.) are reused, and only new or changed rows are
+        optimized. Default None optimizes every row.
+    return_rows : `bool`
+        If True, also return the per-row results to pass as `previous`
+        to a later call. Default False.
+    resolve_conflicts : `bool`
+        Move sequences so different fields are not scheduled at the
+        same time (see `resolve_ddf_conflicts`). Default False keeps
+        the placement each row gets on its own.
+    refine_times : `bool`
+        Place sequences between the DDF grid points, at the peak of the
+        g band depth (see `optimize_ddf_times`). Default False uses the
+        grid point times.
+
+    Returns
+    -------
+    result : `rubin_scheduler.scheduler.utils.ScheduledObservationArray`
+        The scheduled DDF observations.
+    row_results : `dict`
+        Only if return_rows is True.
     """
-    if data_file is None:
-        data_file = os.path.join(get_data_dir(), "scheduler", "ddf_grid.npz")
+    if (cache_dir is not None) and return_rows:
+        # The per-row results aren't cached, so always regenerate.
+        refresh_cache = True
+    if cache_dir is not None:
+        sched_hash = ddf_schedule_hash(
+            ddf_config_file,
+            data_file=data_file,
+            mjd_tol=mjd_tol,
+            expt=expt,
+            alt_min=alt_min,
+            alt_max=alt_max,
+            HA_min=HA_min,
+            HA_max=HA_max,
+            sun_alt_max=sun_alt_max,
+            moon_min_distance=moon_min_distance,
+            dist_tol=dist_tol,
+            bands=bands,
+            nsnaps=nsnaps,
+            mjd_start=mjd_start,
+            survey_length=survey_length,
+            low_season_frac=low_season_frac,
+            low_season_rate=low_season_rate,
+            overhead=overhead,
+            illum_limit=illum_limit,
+            resolve_conflicts=resolve_conflicts,
+            refine_times=refine_times,
+        )
+        cache_file = os.path.join(cache_dir, "ddf_sched_%s.npy" % sched_hash)
+        if os.path.isfile(cache_file) and not refresh_cache:
+            return np.load(cache_file).view(ScheduledObservationArray)
 
     mjd_tol = mjd_tol / 60 / 24.0  # minutes to days
     alt_min = np.radians(alt_min)
@@ -508,163 +1625,117 @@ def generate_ddf_scheduled_obs(
     moon_min_distance = np.radians(moon_min_distance)
 
     ddfs = ddf_locations()
-    ddf_data = np.load(data_file)
-    ddf_grid = ddf_data["ddf_grid"].copy()
-
-    mjd_max = mjd_start + survey_length * 365.25
-
-    # check if our pre-computed grid is over the time range we think
-    # we are scheduling for
-    if (ddf_grid["mjd"].min() > mjd_start) | (ddf_grid["mjd"].max() < mjd_max):
-        warnings.warn("Pre-computed DDF properties don't match requested survey times")
-
-    in_range = np.where((ddf_grid["mjd"] >= mjd_start) & (ddf_grid["mjd"] <= mjd_max))
-    ddf_grid = ddf_grid[in_range]
+    # Load the grid before starting any workers, so they can
+    # share the memory-mapped file.
+    DDF_GRID_CACHE.get(
+        data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+    )
 
     # read in the config file
-    configs = pd.read_csv(ddf_config_file, sep=",", comment="#")
-
-    # can loop over each row to generate the observations that
-    # row calls for
-    all_scheduled_obs = []
-    for index, row in configs.iterrows():
-
-        ddf_name = row["ddf_name"]
-        offseason_length = (365.0 - row["season_length"]) / 2.0  # stupid factor of 2
-        n_sequences = row["n_sequences"]
-
-        sequence_time = 0.0
-        sequence_dict = {}
-        flush_length = row["flush_length"]
-
-        u_only = False
-        y_only = False
-        sum_filters = row["u"] + row["g"] + row["r"] + row["i"] + row["z"] + row["y"]
-        if sum_filters == row["u"]:
-            u_only = True
-        elif sum_filters == row["y"]:
-            y_only = True
-
-        for bandname in "ugrizy":
-            sequence_dict[bandname] = row[bandname]
-            sequence_time += (expt[bandname] + overhead * nsnaps[bandname]) * row[
-                bandname
-            ]
-
-        # XXX--need to catch if only u or only y, then
-        # put in some lunar illumination masks maybe.
-
-        mask_even_odd = None
-        if row["even_odd_None"].strip() == "even":
-            mask_even_odd = True
-        elif row["even_odd_None"].strip() == "odd":
-            mask_even_odd = False
-
-        moon_illum_gt = None
-        moon_illum_lt = None
-        if u_only:
-            moon_illum_lt = illum_limit
-        if y_only:
-            moon_illum_gt = illum_limit
-
-        mjds = optimize_ddf_times(
-            ddf_name,
-            ddfs[ddf_name][0],
-            ddf_grid,
-            sun_limit=-18,
-            sequence_time=sequence_time / 60.0,
-            airmass_limit=2.5,
-            sky_limit=None,
-            g_depth_limit=row["g_depth_limit"],
-            offseason_length=offseason_length,
-            low_season_frac=0,
-            low_season_rate=0.3,
-            mjd_start=SURVEY_START_MJD,
-            season_seq=n_sequences,
-            only_season=row["season"],
-            mask_even_odd=mask_even_odd,
-            moon_illum_lt=moon_illum_lt,
-            moon_illum_gt=moon_illum_gt,
-        )[0]
-
-        for mjd in mjds:
-            for bandname in sequence_dict:
-                if "EDFS" in ddf_name:
-                    obs = ScheduledObservationArray(
-                        n=int(np.ceil(sequence_dict[bandname] / 2))
-                    )
-                    obs["RA"] = np.radians(ddfs[ddf_name][0])
-                    obs["dec"] = np.radians(ddfs[ddf_name][1])
-                    obs["mjd"] = mjd
-                    obs["flush_by_mjd"] = mjd + flush_length
-                    obs["exptime"] = expt[bandname]
-                    obs["band"] = bandname
-                    obs["nexp"] = nsnaps[bandname]
-                    obs["scheduler_note"] = "DD:%s" % ddf_name
-                    obs["target_name"] = "DD:%s" % ddf_name
-                    obs["science_program"] = "DD"
-                    obs["observation_reason"] = "FBS"
-
-                    obs["mjd_tol"] = mjd_tol
-                    obs["dist_tol"] = dist_tol
-                    # Need to set something for HA limits
-                    obs["HA_min"] = HA_min
-                    obs["HA_max"] = HA_max
-                    obs["alt_min"] = alt_min
-                    obs["alt_max"] = alt_max
-                    obs["sun_alt_max"] = sun_alt_max
-                    all_scheduled_obs.append(obs)
-
-                    obs = ScheduledObservationArray(
-                        n=int(np.ceil(sequence_dict[bandname] / 2))
-                    )
-                    obs["RA"] = np.radians(ddfs[ddf_name.replace("_a", "_b")][0])
-                    obs["dec"] = np.radians(ddfs[ddf_name.replace("_a", "_b")][1])
-                    obs["mjd"] = mjd
-                    obs["flush_by_mjd"] = mjd + flush_length
-                    obs["exptime"] = expt[bandname]
-                    obs["band"] = bandname
-                    obs["nexp"] = nsnaps[bandname]
-                    obs["scheduler_note"] = "DD:%s" % ddf_name.replace("_a", "_b")
-                    obs["target_name"] = "DD:%s" % ddf_name.replace("_a", "_b")
-                    obs["science_program"] = "DD"
-                    obs["observation_reason"] = "FBS"
-
-                    obs["mjd_tol"] = mjd_tol
-                    obs["dist_tol"] = dist_tol
-                    # Need to set something for HA limits
-                    obs["HA_min"] = HA_min
-                    obs["HA_max"] = HA_max
-                    obs["alt_min"] = alt_min
-                    obs["alt_max"] = alt_max
-                    obs["sun_alt_max"] = sun_alt_max
-                    obs["moon_min_distance"] = moon_min_distance
-                    all_scheduled_obs.append(obs)
-
-                else:
-                    obs = ScheduledObservationArray(n=sequence_dict[bandname])
-                    obs["RA"] = np.radians(ddfs[ddf_name][0])
-                    obs["dec"] = np.radians(ddfs[ddf_name][1])
-                    obs["mjd"] = mjd
-                    obs["flush_by_mjd"] = mjd + flush_length
-                    obs["exptime"] = expt[bandname]
-                    obs["band"] = bandname
-                    obs["nexp"] = nsnaps[bandname]
-                    obs["scheduler_note"] = "DD:%s" % ddf_name
-                    obs["target_name"] = "DD:%s" % ddf_name
-                    obs["science_program"] = "DD"
-                    obs["observation_reason"] = "FBS"
-
-                    obs["mjd_tol"] = mjd_tol
-                    obs["dist_tol"] = dist_tol
-                    # Need to set something for HA limits
-                    obs["HA_min"] = HA_min
-                    obs["HA_max"] = HA_max
-                    obs["alt_min"] = alt_min
-                    obs["alt_max"] = alt_max
-                    obs["sun_alt_max"] = sun_alt_max
-                    obs["moon_min_distance"] = moon_min_distance
-                    all_scheduled_obs.append(obs)
-
-    result = np.concatenate(all_scheduled_obs)
+    if isinstance(ddf_config_file, pd.DataFrame):
+        configs = ddf_config_file
+    else:
+        configs = pd.read_csv(ddf_config_file, sep=",", comment="#")
+
+    # Each row of the config is independent, so they can be
+    # evaluated in parallel. map keeps the output in config order.
+    row_params = {
+        "data_file": data_file,
+        "mjd_start": mjd_start,
+        "survey_length": survey_length,
+        "expt": expt,
+        "nsnaps": nsnaps,
+        "overhead": overhead,
+        "illum_limit": illum_limit,
+        "moon_min_distance": moon_min_distance,
+        "refine_times": refine_times,
+    }
+    row_func = partial(config_row_sequences, **row_params)
+    rows = [row for index, row in configs.iterrows()]
+
+    # Only evaluate rows that weren't already done in a previous call.
+    if previous is None:
+        previous = {}
+    row_keys = [_config_row_key(row, row_params) for row in rows]
+    todo = [i for i, key in enumerate(row_keys) if key not in previous]
+    todo_rows = [rows[i] for i in todo]
+    if executor is not None:
+        todo_sequences = list(executor.map(row_func, todo_rows))
+    elif (n_workers is not None) and (n_workers > 1):
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            todo_sequences = list(pool.map(row_func, todo_rows))
+    else:
+        todo_sequences = [row_func(row) for row in todo_rows]
+
+    row_results = dict(previous)
+    for i, row_sequence in zip(todo, todo_sequences):
+        row_results[row_keys[i]] = row_sequence
+    row_sequences = [row_results[key] for key in row_keys]
+    row_results = {key: row_results[key] for key in row_keys}
+
+    # Rows are placed independently, so sort out fields that landed on
+    # top of each other. Done on every call, as a changed row can move
+    # sequences of unchanged ones.
+    if resolve_conflicts:
+        conflict_params = dict(row_params)
+        del conflict_params["moon_min_distance"]
+        row_mjds, n_unresolved = resolve_ddf_conflicts(
+            rows, [row_sequence[0] for row_sequence in row_sequences], **conflict_params
+        )
+        if n_unresolved > 0:
+            warnings.warn(
+                "%i DDF sequence blocks overlap and could not be moved" % n_unresolved
+            )
+        row_sequences = [
+            (mjds,) + tuple(row_sequence[1:])
+            for mjds, row_sequence in zip(row_mjds, row_sequences)
+        ]
+
+    # Now that we know how many visits there are, allocate them all at once
+    # and fill each row's block of sequences column by column.
+    n_obs = np.sum(
+        [mjds.size * len(seq_bands) for mjds, _, _, seq_bands, _ in row_sequences]
+    )
+    result = ScheduledObservationArray(n=int(n_obs))
+
+    start = 0
+    for mjds, flush_length, seq_names, seq_bands, seq_moon_dists in row_sequences:
+        end = start + mjds.size * len(seq_bands)
+        if end == start:
+            continue
+        block = result[start:end]
+        n_seq = mjds.size
+
+        block["RA"] = np.tile([np.radians(ddfs[name][0]) for name in seq_names], n_seq)
+        block["dec"] = np.tile([np.radians(ddfs[name][1]) for name in seq_names], n_seq)
+        block["mjd"] = np.repeat(mjds, len(seq_bands))
+        block["flush_by_mjd"] = block["mjd"] + flush_length
+        block["exptime"] = np.tile([expt[bandname] for bandname in seq_bands], n_seq)
+        block["band"] = np.tile(seq_bands, n_seq)
+        block["nexp"] = np.tile([nsnaps[bandname] for bandname in seq_bands], n_seq)
+        block["scheduler_note"] = np.tile(["DD:%s" % name for name in seq_names], n_seq)
+        block["target_name"] = block["scheduler_note"]
+        block["moon_min_distance"] = np.tile(seq_moon_dists, n_seq)
+        start = end
+
+    result["science_program"] = "DD"
+    result["observation_reason"] = "FBS"
+    result["mjd_tol"] = mjd_tol
+    result["dist_tol"] = dist_tol
+    # Need to set something for HA limits
+    result["HA_min"] = HA_min
+    result["HA_max"] = HA_max
+    result["alt_min"] = alt_min
+    result["alt_max"] = alt_max
+    result["sun_alt_max"] = sun_alt_max
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_file = cache_file + ".%i.tmp" % os.getpid()
+        with open(temp_file, "wb") as outfile:
+            np.save(outfile, result)
+        os.replace(temp_file, cache_file)
+
+    if return_rows:
+        return result, row_results
     return result
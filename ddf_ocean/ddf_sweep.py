@@ -0,0 +1,226 @@
+__all__ = ("ddf_sweep", "sweep_argparser")
+
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from rubin_scheduler.utils import SURVEY_START_MJD
+
+from ddf_presched import DDF_GRID_CACHE, config_row_sequences, nearest_grid_index
+
+
+def _sweep_key(row):
+    """Everything in a sweep row that changes the sequence placement"""
+    return tuple((col, val) for col, val in row.items() if col != "flush_length")
+
+
+def _sweep_row(row, data_file=None, mjd_start=SURVEY_START_MJD, survey_length=10.0):
+    """Optimize one candidate config row and summarize the result"""
+    mjds = config_row_sequences(
+        row, data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+    )[0]
+    ddf_grid, night = DDF_GRID_CACHE.get(
+        data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+    )
+    indx = nearest_grid_index(ddf_grid["mjd"], mjds)
+    m5s = ddf_grid["%s_m5_g" % row["ddf_name"]][indx]
+    nights = night[indx]
+
+    summary = {"n_scheduled": mjds.size}
+    if mjds.size > 0:
+        summary["first_night"] = nights.min()
+        summary["last_night"] = nights.max()
+        summary["median_gap"] = np.median(np.diff(nights)) if nights.size > 1 else 0
+        summary["mean_m5_g"] = np.mean(m5s)
+        summary["min_m5_g"] = np.min(m5s)
+    else:
+        summary["first_night"] = -1
+        summary["last_night"] = -1
+        summary["median_gap"] = 0
+        summary["mean_m5_g"] = np.nan
+        summary["min_m5_g"] = np.nan
+    return summary
+
+
+def ddf_sweep(
+    ddf_names,
+    seasons,
+    season_length=[225],
+    n_sequences=[75],
+    g_depth_limit=[23.5],
+    even_odd=["none"],
+    flush_length=[2.0],
+    sequence={"g": 2, "r": 2, "i": 2, "z": 2},
+    data_file=None,
+    mjd_start=SURVEY_START_MJD,
+    survey_length=10.0,
+    n_workers=None,
+):
+    """Evaluate DDF sequence placement over a grid of config parameters
+
+    Each combination is a row like the ones in the ocean*.dat config
+    files, and is run through the same optimization as
+    `generate_ddf_scheduled_obs`, without running a simulation.
+
+    Parameters
+    ----------
+    ddf_names : `list` of `str`
+        The DDFs to evaluate.
+    seasons : `list` of `int`
+        The seasons to evaluate.
+    season_length, n_sequences, g_depth_limit, even_odd, flush_length : `list`
+        Values to try for each of the config columns. flush_length does
+        not change the placement, it is carried along for convenience.
+    sequence : `dict`
+        Number of visits per band in each sequence. Bands not
+        included get zero visits.
+    data_file : `path` (None)
+        The DDF grid file. Default None uses the one in rubin_sim_data.
+    mjd_start : `float`
+        Starting MJD of the survey.
+    survey_length : `float`
+        Length of survey (years).
+    n_workers : `int`
+        Number of processes to use. Default None runs serially.
+
+    Returns
+    -------
+    result : `pd.DataFrame`
+        One row per combination, with the number of sequences
+        scheduled, first and last night, median gap between nights,
+        and the mean and minimum g band m5 at the chosen times.
+    """
+    # Load the grid before starting any workers, so they can
+    # share the memory-mapped file.
+    DDF_GRID_CACHE.get(
+        data_file=data_file, mjd_start=mjd_start, survey_length=survey_length
+    )
+
+    rows = []
+    for combo in itertools.product(
+        ddf_names,
+        seasons,
+        season_length,
+        n_sequences,
+        g_depth_limit,
+        even_odd,
+        flush_length,
+    ):
+        row = dict(
+            zip(
+                [
+                    "ddf_name",
+                    "season",
+                    "season_length",
+                    "n_sequences",
+                    "g_depth_limit",
+                    "even_odd_None",
+                    "flush_length",
+                ],
+                combo,
+            )
+        )
+        for bandname in "ugrizy":
+            row[bandname] = sequence.get(bandname, 0)
+        rows.append(row)
+
+    # flush_length doesn't change where sequences go, only optimize
+    # each distinct combination of everything else once.
+    keys = [_sweep_key(row) for row in rows]
+    unique_rows = {}
+    for key, row in zip(keys, rows):
+        unique_rows.setdefault(key, row)
+
+    row_func = partial(
+        _sweep_row,
+        data_file=data_file,
+        mjd_start=mjd_start,
+        survey_length=survey_length,
+    )
+    if (n_workers is not None) and (n_workers > 1):
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            summaries = list(pool.map(row_func, unique_rows.values()))
+    else:
+        summaries = [row_func(row) for row in unique_rows.values()]
+    summaries = dict(zip(unique_rows.keys(), summaries))
+
+    result = [{**row, **summaries[key]} for key, row in zip(keys, rows)]
+
+    return pd.DataFrame(result)
+
+
+def sweep_argparser():
+    parser = argparse.ArgumentParser(
+        description="Evaluate DDF sequence placement over a grid of config parameters"
+    )
+    parser.add_argument("--ddf_names", type=str, nargs="+", default=["COSMOS"])
+    parser.add_argument("--seasons", type=int, nargs="+", default=list(range(11)))
+    parser.add_argument("--season_length", type=float, nargs="+", default=[225.0])
+    parser.add_argument("--n_sequences", type=int, nargs="+", default=[75])
+    parser.add_argument("--g_depth_limit", type=float, nargs="+", default=[23.5])
+    parser.add_argument(
+        "--even_odd",
+        type=str,
+        nargs="+",
+        default=["none"],
+        help="Any of none, even, odd",
+    )
+    parser.add_argument("--flush_length", type=float, nargs="+", default=[2.0])
+    parser.add_argument(
+        "--sequence",
+        type=str,
+        default="g:2,r:2,i:2,z:2",
+        help="Visits per band in each sequence, e.g. u:3 or g:2,r:2,i:2,z:2",
+    )
+    parser.add_argument("--data_file", type=str, default=None, help="DDF grid file")
+    parser.add_argument(
+        "--mjd_start", type=float, default=SURVEY_START_MJD, help="Survey start MJD"
+    )
+    parser.add_argument(
+        "--survey_length", type=float, default=10.0, help="Survey length (years)"
+    )
+    parser.add_argument("--n_workers", type=int, default=None)
+    parser.add_argument(
+        "--outfile",
+        type=str,
+        default="ddf_sweep.npz",
+        help="Output file, .npz or .parquet",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    parser = sweep_argparser()
+    args = parser.parse_args()
+
+    sequence = {}
+    for band_visits in args.sequence.split(","):
+        bandname, n_visits = band_visits.split(":")
+        sequence[bandname.strip()] = int(n_visits)
+
+    result = ddf_sweep(
+        args.ddf_names,
+        args.seasons,
+        season_length=args.season_length,
+        n_sequences=args.n_sequences,
+        g_depth_limit=args.g_depth_limit,
+        even_odd=args.even_odd,
+        flush_length=args.flush_length,
+        sequence=sequence,
+        data_file=args.data_file,
+        mjd_start=args.mjd_start,
+        survey_length=args.survey_length,
+        n_workers=args.n_workers,
+    )
+
+    if args.outfile.endswith(".parquet"):
+        result.to_parquet(args.outfile)
+    else:
+        sweep = result.to_records(
+            index=False, column_dtypes={"ddf_name": "U20", "even_odd_None": "U4"}
+        )
+        np.savez(args.outfile, sweep=sweep)
+    print("Wrote %i rows to %s" % (len(result), args.outfile))
@@ -1240,6 +1240,8 @@ def ddf_surveys(
     nside=None,
     expt=29.2,
     nexp=2,
+    data_file=None,
+    mjd_start=SURVEY_START_MJD,
 ):
     """Generate surveys for DDF observations
 
@@ -1255,12 +1257,21 @@ def ddf_surveys(
         Default None.
     expt : `float`
         Exposure time for DDF visits. Default 29.2.
+    data_file : `str`
+        DDF grid file, e.g. made with ddf_ocean/ddf_grid.py for
+        mjd_start. Default None uses the one in rubin_sim_data.
+    mjd_start : `float`
+        Start of the survey. Default SURVEY_START_MJD.
     """
     nsnaps = [1, 2, 2, 2, 2, 2]
     if nexp == 1:
         nsnaps = [1, 1, 1, 1, 1, 1]
     obs_array = generate_ddf_scheduled_obs(
-        offseason_length=offseason_length, expt=expt, nsnaps=nsnaps
+        offseason_length=offseason_length,
+        expt=expt,
+        nsnaps=nsnaps,
+        data_file=data_file,
+        mjd_start=mjd_start,
     )
     euclid_obs = np.where(
         (obs_array["scheduler_note"] == "DD:EDFS_b")
@@ -1610,7 +1621,7 @@ def gen_scheduler(args):
     camera_ddf_rot_limit = 75.0  # degrees
 
     # Be sure to also update and regenerate DDF grid save file
-    # if changing mjd_start
+    # if changing mjd_start (ddf_ocean/ddf_grid.py, then --ddf_grid)
     mjd_start = SURVEY_START_MJD + mjd_plus
 
     fileroot, extra_info = set_run_info(
@@ -1696,12 +1707,18 @@ def gen_scheduler(args):
         u_detailer,
         detailers.Rottep2RotspDesiredDetailer(),
     ]
+    # Without a grid for the shifted start, the DDFs are scheduled
+    # from SURVEY_START_MJD on the default grid, as before --ddf_grid
+    ddf_kwargs = {}
+    if args.ddf_grid is not None:
+        ddf_kwargs = {"data_file": args.ddf_grid, "mjd_start": mjd_start}
     ddfs = ddf_surveys(
         detailers=details,
         offseason_length=ddf_offseason_length,
         euclid_detailers=euclid_detailers,
         nside=nside,
         nexp=nexp,
+        **ddf_kwargs,
     )
 
     greedy = gen_greedy_surveys(nside, nexp=nexp, footprints=footprints)
@@ -1821,6 +1838,12 @@ def sched_argparser():
         default=0,
         help="number of days to add to the mjd start",
     )
+    parser.add_argument(
+        "--ddf_grid",
+        type=str,
+        default=None,
+        help="DDF grid file covering the shifted survey, from ddf_ocean/ddf_grid.py",
+    )
     parser.add_argument(
         "--split_long",
         dest="split_long",